@@ -0,0 +1,170 @@
+import os, hmac, json, asyncio, collections
+import tornado.ioloop, tornado.web
+import downloader, formatselect, fragments, jobs, scheduler
+
+# JSON API served by the file server's Tornado app, next to the Streamlit UI:
+#   POST /api/jobs                {"url", "mode", "format", "workers", "fragments", "clip", "audio"} -> 201 job
+#                                 clip (video only): {"ranges": [[start, end], ...], "precise": false}
+#                                 audio: "copy" (m4a/opus as served) or "mp3" for an audio-only job
+#   GET  /api/jobs                recent jobs
+#   GET  /api/jobs/<id>           status and progress; ?items=1 adds items, ?wait=30&version=N
+#                                 long-polls until the job changes past version N
+#   GET  /api/jobs/<id>/events    NDJSON stream of status updates until the job ends
+#   GET  /api/outputs             finished jobs and their download URLs
+#   GET  /api/formats?url=        ranked format pairs for a single video
+#   GET  /api/workers             live worker.py processes and the items each holds (remote jobs)
+# Long polls do not touch SQLite while they wait: one periodic check compares the job manager's
+# per-job change counters and wakes only the waiters of jobs that changed.
+# The API lists every session's download URLs and starts downloads, so the file server binds it to
+# localhost; with API_TOKEN set, each request must also carry "Authorization: Bearer <API_TOKEN>".
+# workers and fragments are clamped to what the UI offers.
+API_TOKEN = os.environ.get("API_TOKEN")
+MAX_WAIT = 60
+WATCH_INTERVAL = 0.25
+PRIVATE = ('session',)
+
+_waiters = collections.defaultdict(dict)  # job id -> {future of a waiting poll: version it saw}
+_watcher = None
+
+def watch():
+    versions = jobs.get_manager().versions
+    for job_id, futures in list(_waiters.items()):
+        for future, version in list(futures.items()):
+            if not future.done() and versions[job_id] != version:
+                future.set_result(None)
+
+async def changed(job_id, version, timeout):
+    global _watcher
+    if _watcher is None:
+        _watcher = tornado.ioloop.PeriodicCallback(watch, WATCH_INTERVAL * 1000)
+        _watcher.start()
+    future = asyncio.get_running_loop().create_future()
+    _waiters[job_id][future] = version
+    try:
+        await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        _waiters[job_id].pop(future, None)
+        if not _waiters[job_id]:
+            del _waiters[job_id]
+
+def public(job):
+    return {k: v for k, v in job.items() if k not in PRIVATE}
+
+def job_status(manager, job_id, with_items=False):
+    job = manager.job(job_id)
+    if not job:
+        raise tornado.web.HTTPError(404, reason=f"No job {job_id}")
+    items = manager.items(job_id)
+    status = {**public(job), 'version': manager.versions[job_id], 'videos': len(items),
+              'done': sum(i['status'] in ('finished', 'failed') for i in items),
+              'failed': sum(i['status'] == 'failed' for i in items),
+              'downloaded_bytes': sum(i['downloaded'] or 0 for i in items), 'total_bytes': sum(i['total'] or 0 for i in items)}
+    waiting = scheduler.get_scheduler().position(job_id) if job['status'] == 'running' else None
+    if waiting:
+        status.update(queue_position=waiting[0], starts_in=round(waiting[1], 1))
+    tuner = manager.tuners.get(job_id)
+    if tuner:
+        status.update(fragment_level=tuner.level, fragment_rate=round(tuner.rate), fragment_backoffs=tuner.backoffs)
+    if with_items:
+        status['items'] = items
+    return status
+
+class ApiHandler(tornado.web.RequestHandler):
+    def set_default_headers(self):
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+
+    def prepare(self):
+        if API_TOKEN and not hmac.compare_digest(self.request.headers.get("Authorization", ""), f"Bearer {API_TOKEN}"):
+            raise tornado.web.HTTPError(401, reason="Missing or wrong API token")
+
+    def write_error(self, status_code, **kwargs):
+        self.finish({'error': self._reason})
+
+    def body(self):
+        try:
+            return json.loads(self.request.body or b"{}")
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="Body must be JSON")
+
+class JobsHandler(ApiHandler):
+    def get(self):
+        self.finish({'jobs': [public(j) for j in jobs.get_manager().recent(int(self.get_argument('limit', 100)))]})
+
+    async def post(self):
+        req, manager = self.body(), jobs.get_manager()
+        if not req.get('url'):
+            raise tornado.web.HTTPError(400, reason="url is required")
+        try:
+            # a single video is resolved over the network first; keep the event loop free
+            job_id = await tornado.ioloop.IOLoop.current().run_in_executor(
+                None, lambda: jobs.submit_url(manager, req['url'], req.get('mode', 'video'), req.get('format'),
+                                              min(max(int(req.get('workers', 4)), 1), jobs.MAX_WORKERS),
+                                              f"api-{self.request.remote_ip}",
+                                              min(max(int(req.get('fragments', 0)), 0), fragments.MAX_FRAGMENTS),
+                                              req.get('clip'), req.get('audio')))
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, reason=str(e))
+        except Exception as e:
+            raise tornado.web.HTTPError(502, reason=f"Could not resolve {req['url']}: {e}")
+        self.set_status(201)
+        self.set_header("Location", f"/api/jobs/{job_id}")
+        self.finish(job_status(manager, job_id))
+
+class JobHandler(ApiHandler):
+    async def get(self, job_id):
+        manager = jobs.get_manager()
+        wait, version = min(float(self.get_argument('wait', 0)), MAX_WAIT), self.get_argument('version', None)
+        if wait and version is not None and manager.versions[job_id] == int(version):
+            await changed(job_id, int(version), wait)
+        self.finish(job_status(manager, job_id, self.get_argument('items', '0') == '1'))
+
+class JobEventsHandler(ApiHandler):
+    def set_default_headers(self):
+        self.set_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.set_header("Cache-Control", "no-cache")
+
+    async def get(self, job_id):
+        manager = jobs.get_manager()
+        while True:
+            version = manager.versions[job_id]
+            status = job_status(manager, job_id)
+            self.write(json.dumps(status) + "\n")
+            await self.flush()
+            if status['status'] not in ('queued', 'running'):
+                break
+            await changed(job_id, version, MAX_WAIT)
+
+class OutputsHandler(ApiHandler):
+    def get(self):
+        self.finish({'outputs': [{'job': j['id'], 'mode': j['mode'], 'title': j['title'], 'url': j['output'],
+                                  'finished': j['updated']}
+                                 for j in jobs.get_manager().recent(int(self.get_argument('limit', 100)))
+                                 if j['status'] == 'finished' and j['output']]})
+
+class FormatsHandler(ApiHandler):
+    async def get(self):
+        url = self.get_argument('url')
+        try:
+            info = await tornado.ioloop.IOLoop.current().run_in_executor(None, downloader.fetch_entry, url)
+        except Exception as e:
+            raise tornado.web.HTTPError(502, reason=f"Could not resolve {url}: {e}")
+        self.finish({'id': info['id'], 'title': info.get('title'), 'formats': [
+            {'format': f"{p['video']['format_id']}+{p['audio']['format_id']}", 'label': formatselect.pair_label(p),
+             'container': p['container'], 'height': p['video'].get('height'),
+             'estimated_bytes': formatselect.estimate_size([p['video'], p['audio']], info.get('duration'))}
+            for p in formatselect.ranked_pairs(info.get('formats') or [])]})
+
+class WorkersHandler(ApiHandler):
+    def get(self):
+        self.finish({'workers': jobs.get_manager().workers()})
+
+ROUTES = [
+    (r"/api/jobs", JobsHandler),
+    (r"/api/jobs/(\w+)", JobHandler),
+    (r"/api/jobs/(\w+)/events", JobEventsHandler),
+    (r"/api/outputs", OutputsHandler),
+    (r"/api/formats", FormatsHandler),
+    (r"/api/workers", WorkersHandler),
+]
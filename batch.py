@@ -0,0 +1,94 @@
+import os, sys, json, time, shutil, argparse, itertools, threading
+from concurrent.futures import ThreadPoolExecutor
+import jobs
+
+# Headless batch runner on the same job engine as the UI. Each input line is a JSON object:
+#   {"url": "...", "mode": "video|playlist|channel|sync", "format": "bestvideo+bestaudio",
+#    "output": "mirror/channel.zip", "workers": 4, "fragments": 0, "clip": {"ranges": [[30, 90]]},
+#    "audio": "copy|mp3"}
+# Only url is required; output may be a file path or an existing directory (default --outdir), and
+# format defaults to bestvideo+bestaudio, or to the best audio-only format for an audio job.
+# Requests run --jobs at a time (downloads are still capped process-wide by MAX_DOWNLOADS) and
+# one JSON result per request, with per-item status and timings, is appended to --results.
+#
+#   python batch.py requests.jsonl --results results.jsonl --jobs 4
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Download a JSONL file of requests without the UI")
+    p.add_argument("requests", help="JSONL file, or - for stdin")
+    p.add_argument("--results", default="results.jsonl", help="JSONL file results are appended to")
+    p.add_argument("--outdir", default=os.path.join("downloads", "batch"), help="where outputs go by default")
+    p.add_argument("--jobs", type=int, default=2, help="requests processed at once")
+    p.add_argument("--workers", type=int, default=4, help="parallel downloads per playlist/channel")
+    p.add_argument("--db", default=os.path.join("downloads", "batch.db"),
+                   help="job database; separate from the UI's so neither resumes the other's jobs")
+    p.add_argument("--remote", action="store_true",
+                   help="leave playlist/channel/sync downloads to worker.py processes started with the same --db")
+    return p.parse_args(argv)
+
+def read_requests(path):
+    with (sys.stdin if path == "-" else open(path, encoding='utf-8')) as f:
+        for n, line in enumerate(f, 1):
+            if line.strip():
+                yield n, json.loads(line)
+
+# Moves path to target, a file path or an existing directory. In a directory, a name another request
+# already took (the same title twice, e.g. in two formats) gets " (2)", " (3)", ... before its extension;
+# the name is claimed by creating it, so requests finishing at once cannot pick the same one.
+def deliver(path, target, name=None):
+    if os.path.isdir(target):
+        base, ext = os.path.splitext(name or os.path.basename(path))
+        for n in itertools.count(1):
+            candidate = os.path.join(target, f"{base}{f' ({n})' if n > 1 else ''}{ext}")
+            try:
+                open(candidate, 'x').close()
+                break
+            except FileExistsError:
+                pass
+        target = candidate
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    return os.path.abspath(shutil.move(path, target))
+
+def run_request(manager, n, req, args):
+    start = time.monotonic()
+    result = {'line': n, 'url': req.get('url'), 'mode': req.get('mode', 'video')}
+    try:
+        job_id = jobs.submit_url(manager, req['url'], req.get('mode', 'video'), req.get('format'),
+                                 req.get('workers', args.workers), fragments=req.get('fragments', 0), clip=req.get('clip'),
+                                 audio=req.get('audio'))
+        while manager.job(job_id)['status'] in ('queued', 'running'):
+            time.sleep(0.5)
+        job, items = manager.job(job_id), manager.items(job_id)
+        output = job['output'] and (deliver(job['output'], req['output']) if req.get('output') else job['output'])
+        result.update(job=job_id, status=job['status'], error=job['error'], output=output,
+                      bytes=sum(i['total'] or 0 for i in items), failed=sum(i['status'] == 'failed' for i in items),
+                      items=[{k: i[k] for k in ('idx', 'video_id', 'title', 'status', 'error', 'total', 'estimate', 'full_size',
+                                                'extract_time', 'download_time', 'merge_time')} for i in items])
+    except Exception as e:
+        result.update(status='failed', error=str(e))
+    result['wall_s'] = round(time.monotonic() - start, 3)
+    return result
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(args.outdir, exist_ok=True)
+    # finished files land in outdir, and run_request moves them on if the request names an output
+    manager = jobs.JobManager(args.db, publish=lambda path, name=None: deliver(path, args.outdir, name),
+                              remote=args.remote or jobs.REMOTE_WORKERS)
+    lock, counts = threading.Lock(), {'finished': 0, 'failed': 0}
+    with open(args.results, 'a', encoding='utf-8') as out:
+        def record(result):
+            with lock:
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                counts['finished' if result['status'] == 'finished' else 'failed'] += 1
+                print(f"[{result['line']}] {result['status']} {result['url']} -> {result.get('output') or result.get('error')}",
+                      file=sys.stderr)
+        with ThreadPoolExecutor(max_workers=args.jobs, thread_name_prefix="batch") as pool:
+            for n, req in read_requests(args.requests):
+                pool.submit(run_request, manager, n, req, args).add_done_callback(lambda f: record(f.result()))
+    print(f"{counts['finished']} finished, {counts['failed']} failed", file=sys.stderr)
+    return 1 if counts['failed'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
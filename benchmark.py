@@ -0,0 +1,529 @@
+import os, re, sys, json, time, socket, shutil, argparse, tempfile, resource, threading, subprocess, urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Offline benchmark of the real job path: listing -> scheduler -> download -> ffmpeg merge -> ZIP ->
+# publish. A local HTTP server streams synthetic DASH-style video and audio (generated once with
+# ffmpeg), and a stub extractor registered ahead of yt-dlp's own answers YouTube watch, playlist and
+# channel URLs with listings of any size, so nothing touches the network.
+#
+#   python benchmark.py --scenarios single,playlist,channel,sync --videos 20 --workers 1,4,8
+#
+# Reports wall time, throughput, CPU time, peak RSS, peak disk use and the summed download/merge
+# time per scenario and worker count (the sums exceeding wall time is the pipeline overlap), and the
+# progress hook's own calls and CPU seconds per downloaded GiB (timed inside the hook).
+# The resume scenario SIGKILLs a process halfway through a playlist, resumes the job here and
+# reports how many bytes the media server had to send again. unpooled and pooled download --videos
+# single-video jobs one after another with YoutubeDL pooling off and on and report the time and media
+# connections per item; use short videos to see the overhead (--scenarios unpooled,pooled --duration 1).
+# segmented1 and segmented download a playlist of DASH-segmented videos one fragment at a time and with
+# adaptive parallel fragments from a server throttled per connection (--frag-limit adds 429s). clip
+# cuts the middle fifth out of one video and reports the bytes served against the whole video. audio and
+# mp3 download the playlist audio-only, as served and transcoded through piped ffmpeg; compare their
+# wall time and fetched_mib (bytes the media server sent) with playlist's video+audio. ui runs main.py
+# through Streamlit's AppTest in a fresh process and reports the app's own render times: the cold first
+# page, reruns of the empty page, opening a single video (info lookup and format pairing) and reruns
+# with that video open. distributed downloads the playlist as a remote job through --workers worker.py
+# processes of one thread each on the shared SQLite queue; failover also SIGKILLs one of them halfway,
+# so its leases lapse (WORKER_LEASE, shortened here) and the others take its items over. serve publishes
+# sparse files of --serve-mib sizes and downloads each through the file server, whole and then its second
+# half as a Range request (a resumed browser download), and reports how far this process's RSS grew.
+SCENARIOS = ('single', 'playlist', 'channel', 'sync', 'resume', 'unpooled', 'pooled', 'segmented1', 'segmented',
+             'clip', 'audio', 'mp3', 'ui', 'distributed', 'failover', 'serve')
+SERVE_FLAT = 32 * 1024 ** 2  # RSS growth while serving that still counts as flat
+UI_RERUNS = 5
+RESUME_RATE = 4  # MiB/s per stream at least, so the kill lands mid-download
+SEGMENT_RATE = 2  # MiB/s per connection at least in the segmented scenarios, like a CDN edge
+FRAGMENT_BYTES = 256 * 1024
+HTTP_CHUNK = 1024 ** 2  # http_chunk_size of the plain streams, as YouTube's 10 MiB but for short media
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Offline download/merge/archive benchmark")
+    p.add_argument("--scenarios", default=",".join(SCENARIOS))
+    p.add_argument("--kill-at", type=float, default=0.5, help="resume: fraction of the playlist's bytes served before the kill")
+    p.add_argument("--videos", type=int, default=20, help="entries per playlist/channel listing")
+    p.add_argument("--new", type=int, default=3, help="new uploads the sync scenario finds")
+    p.add_argument("--workers", default="1,4,8", help="comma separated worker counts to sweep")
+    p.add_argument("--duration", type=int, default=10, help="seconds of synthetic media per video")
+    p.add_argument("--bitrate", default="2M", help="synthetic video bitrate")
+    p.add_argument("--rate", type=float, default=0, help="per-stream server throttle in MiB/s, 0 = unthrottled")
+    p.add_argument("--page-delay", type=float, default=0, help="seconds per listing page of 30 entries")
+    p.add_argument("--frag-limit", type=int, default=0, help="answer 429 above this many concurrent fragment requests")
+    p.add_argument("--serve-mib", default="16,256,2048", help="serve: comma separated sizes of the published files")
+    p.add_argument("--cache", action="store_true", help="keep the media cache enabled")
+    p.add_argument("--json", help="also write results to this file")
+    p.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    return p.parse_args(argv)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# Fragmented MP4 like a DASH representation; libx264 when available, mpeg4 otherwise.
+def make_media(outdir, duration, bitrate):
+    os.makedirs(outdir, exist_ok=True)
+    video, audio = os.path.join(outdir, "video.mp4"), os.path.join(outdir, "audio.m4a")
+    frag = ['-movflags', 'frag_keyframe+empty_moov+default_base_moof+global_sidx']
+    def encode(*codec):
+        subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'lavfi', '-i', 'testsrc2=size=640x360:rate=30',
+                        '-t', str(duration), *codec, '-b:v', bitrate, '-an', *frag, video], check=True, capture_output=True)
+    try:
+        encode('-c:v', 'libx264', '-preset', 'ultrafast')
+        vcodec = 'avc1.64001e'
+    except subprocess.CalledProcessError:
+        encode('-c:v', 'mpeg4')
+        vcodec = 'mp4v.20.9'
+    subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=44100',
+                    '-t', str(duration), '-c:a', 'aac', '-b:a', '128k', '-vn', *frag, audio],
+                   check=True, capture_output=True)
+    with open(video, 'rb') as v, open(audio, 'rb') as a:
+        return {'video': v.read(), 'audio': a.read()}, vcodec
+
+class MediaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like a CDN
+    media, rate, served, connections = {}, 0, 0, 0
+    frag_limit, fragments_active, rejected = 0, 0, 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with self.lock:
+            MediaHandler.connections += 1
+
+    def do_GET(self):
+        if self.path.startswith('/frag/'):
+            return self.fragment()
+        data = self.media.get(self.path.split('/')[2] if self.path.startswith('/media/') else None)
+        if data is None:
+            return self.send_error(404)
+        self.send_data(data)
+
+    # /frag/<kind>/<id>/<n>: the n-th FRAGMENT_BYTES slice of the stream
+    def fragment(self):
+        _, _, kind, _, n = self.path.split('/')
+        data = self.media.get(kind)
+        if data is None:
+            return self.send_error(404)
+        with self.lock:
+            busy = self.frag_limit and MediaHandler.fragments_active >= self.frag_limit
+            MediaHandler.rejected += bool(busy)
+            MediaHandler.fragments_active += not busy
+        if busy:
+            return self.send_error(429)
+        try:
+            self.send_data(data[int(n) * FRAGMENT_BYTES:(int(n) + 1) * FRAGMENT_BYTES])
+        finally:
+            with self.lock:
+                MediaHandler.fragments_active -= 1
+
+    def send_data(self, data):
+        m = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        start, end = (int(m[1]), min(int(m[2] or len(data) - 1), len(data) - 1)) if m else (0, len(data) - 1)
+        if start >= len(data):  # a .part that is already complete; yt-dlp expects 416 here
+            self.send_response(416)
+            self.send_header('Content-Range', f"bytes */{len(data)}")
+            self.send_header('Content-Length', '0')
+            return self.end_headers()
+        self.send_response(206 if m else 200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        if m:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{len(data)}")
+        self.end_headers()
+        for offset in range(start, end + 1, 64 * 1024):
+            chunk = data[offset:min(offset + 64 * 1024, end + 1)]
+            try:
+                self.wfile.write(chunk)
+            except (BrokenPipeError, ConnectionResetError):  # ffmpeg hangs up once it has read past a cut
+                self.close_connection = True
+                return
+            with self.lock:
+                MediaHandler.served += len(chunk)
+            if self.rate:
+                time.sleep(len(chunk) / self.rate)
+
+    def log_message(self, *args):
+        pass
+
+def serve_media(media, rate):
+    MediaHandler.media, MediaHandler.rate = media, rate
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MediaHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+# Registered in front of yt-dlp's extractors so watch, playlist and @channel URLs resolve locally.
+# listings maps a playlist/channel id to its size; entries are produced newest first, page by page.
+# Ids starting with "seg" get DASH-segmented formats served in FRAGMENT_BYTES fragments.
+def install_extractor(base, media, vcodec, duration, page_delay):
+    from yt_dlp import YoutubeDL
+    from yt_dlp.extractor.common import InfoExtractor
+
+    class BenchIE(InfoExtractor):
+        IE_NAME = 'bench'
+        _VALID_URL = r'https?://(?:www\.)?youtube\.com/(?:watch\?v=(?P<id>[\w-]+)|playlist\?list=(?P<list>[\w-]+)|@(?P<channel>[\w-]+))'
+        listings = {}
+
+        def _real_extract(self, url):
+            m = self._match_valid_url(url)
+            if m['id']:
+                return {'id': m['id'], 'title': f"Bench {m['id']}", 'duration': duration, 'formats': [
+                    {'format_id': '137', **self._stream('video', m['id']), 'ext': 'mp4', 'vcodec': vcodec,
+                     'acodec': 'none', 'width': 640, 'height': 360, 'fps': 30, 'filesize': len(media['video'])},
+                    {'format_id': '140', **self._stream('audio', m['id']), 'ext': 'm4a', 'vcodec': 'none',
+                     'acodec': 'mp4a.40.2', 'abr': 128, 'filesize': len(media['audio'])}]}
+            key = m['list'] or m['channel']
+            return self.playlist_result(self._entries(key), key, f"Bench {key}")
+
+        def _stream(self, kind, video_id):
+            if not video_id.startswith('seg'):
+                return {'url': f"{base}/media/{kind}/{video_id}", 'downloader_options': {'http_chunk_size': HTTP_CHUNK}}
+            frag_base = f"{base}/frag/{kind}/{video_id}/"
+            return {'url': frag_base, 'protocol': 'http_dash_segments', 'fragment_base_url': frag_base,
+                    'fragments': [{'path': str(n)} for n in range(-(-len(media[kind]) // FRAGMENT_BYTES))]}
+
+        def _entries(self, key):
+            count = self.listings.get(key, 0)
+            for n, i in enumerate(range(count - 1, -1, -1)):
+                if page_delay and n % 30 == 0:
+                    time.sleep(page_delay)
+                yield self.url_result(f"https://www.youtube.com/watch?v={key}-{i}", BenchIE, f"{key}-{i}", f"Bench {key}-{i}")
+
+    defaults = YoutubeDL.add_default_info_extractors
+    def add_default_info_extractors(self):
+        self.add_info_extractor(BenchIE())  # an instance, so yt-dlp never looks the key up by name
+        defaults(self)
+    YoutubeDL.add_default_info_extractors = add_default_info_extractors
+    return BenchIE
+
+def rss():
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmRSS'))
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def tree_size(*paths):
+    total = 0
+    for path in paths:
+        for dirpath, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.lstat(os.path.join(dirpath, name)).st_size
+                except FileNotFoundError:
+                    pass
+    return total
+
+def read_media(path):
+    media = {}
+    for kind, name in (('video', "video.mp4"), ('audio', "audio.m4a")):
+        with open(os.path.join(path, name), 'rb') as f:
+            media[kind] = f.read()
+    return media
+
+# Child side of the resume scenario: submits the playlist job and runs until it is killed.
+def child(spec):
+    media = read_media(spec['media'])
+    bench = install_extractor(spec['base'], media, spec['vcodec'], spec['duration'], 0)
+    bench.listings[spec['key']] = spec['videos']
+    import jobs
+    manager = jobs.JobManager(os.environ["JOBS_DB"])
+    print(manager.submit('playlist', spec['url'], spec['key'], workers=spec['workers']), flush=True)
+    threading.Event().wait()
+
+# Child side of the ui scenario. The bench extractor is installed after the empty page, which must
+# render without yt-dlp, and after the app's warm-up thread, whose pooled instance predates it.
+def ui_child(spec):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py"), default_timeout=120)
+    for _ in range(spec['reruns'] + 1):
+        at.run()
+    for t in threading.enumerate():
+        if t.name == 'warm-up':
+            t.join()
+    import ydlpool
+    ydlpool.get_pool().clear()
+    install_extractor(spec['base'], read_media(spec['media']), spec['vcodec'], spec['duration'], 0)
+    at.text_input[0].input(spec['url']).run()
+    for _ in range(spec['reruns']):
+        at.run()
+    with open(os.environ["METRICS_LOG"], encoding='utf-8') as f:
+        ms = [round(e['seconds'] * 1000, 1) for e in map(json.loads, f) if e['phase'] == 'render']
+    n = spec['reruns']
+    print(json.dumps({'cold_ms': ms[0], 'rerun_ms': sorted(ms[1:n + 1])[n // 2], 'open_ms': ms[n + 1],
+                      'open_rerun_ms': sorted(ms[n + 2:])[n // 2], 'error': at.exception[0].message if at.exception else None}))
+
+def ui_timings(root, key, spec):
+    env = dict(os.environ, BENCH_UI=json.dumps(spec), JOBS_DB=os.path.join(root, f"{key}.db"),
+               METRICS_LOG=os.path.join(root, f"{key}-metrics.jsonl"), FILE_SERVER_DIR=os.path.join(root, f"{key}-serve"),
+               FILE_SERVER_PORT=str(free_port()))
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__)], env=env, capture_output=True, text=True)
+    if proc.returncode:
+        return {'status': 'failed', 'error': proc.stderr.strip()[-500:], 'videos': 1, 'failed': 1}
+    timings = json.loads(proc.stdout.splitlines()[-1])
+    return {'status': 'failed' if timings['error'] else 'finished', 'videos': 1, 'failed': int(bool(timings['error'])),
+            **timings}
+
+# Child side of the distributed scenarios: a worker.py process that also knows the bench extractor.
+def worker_child(spec):
+    install_extractor(spec['base'], read_media(spec['media']), spec['vcodec'], spec['duration'], 0)
+    import worker
+    return worker.main(['--threads', '1', '--name', spec['name']])
+
+def start_workers(spec, count):
+    return [subprocess.Popen([sys.executable, os.path.abspath(__file__)], stderr=subprocess.DEVNULL,
+                             env=dict(os.environ, BENCH_WORKER=json.dumps({**spec, 'name': f"bench-{spec['key']}-{n}"})))
+            for n in range(count)]
+
+def kill_worker(manager, url, key, procs, total, fraction):
+    MediaHandler.served = 0
+    job_id = manager.submit('playlist', url, key, remote=True)
+    while MediaHandler.served < total * fraction and manager.job(job_id)['status'] == 'running':
+        time.sleep(0.01)
+    procs[0].kill()
+    return job_id
+
+def interrupt(manager, spec, total, fraction):
+    MediaHandler.served = 0
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__)], stdout=subprocess.PIPE, text=True,
+                            env=dict(os.environ, BENCH_CHILD=json.dumps(spec)))
+    job_id = proc.stdout.readline().strip()
+    while MediaHandler.served < total * fraction and proc.poll() is None:
+        time.sleep(0.01)
+    proc.kill()
+    proc.wait()
+    spec['killed_at'] = MediaHandler.served
+    manager.resume()
+    return job_id
+
+def wait(manager, job_id, interval=0.05):
+    while manager.job(job_id)['status'] in ('queued', 'running'):
+        time.sleep(interval)
+    return job_id
+
+# Runs one job (or the list of jobs submit returns) to completion while sampling RSS and disk use
+# of the scratch directories.
+def measure(manager, submit, paths, interval=0.05):
+    import downloader
+    hook = dict(downloader.hook_stats)
+    peak = {'rss': rss(), 'disk': 0}
+    base_disk = tree_size(*paths)
+    done = threading.Event()
+    def sample():
+        while not done.wait(interval):
+            peak['rss'] = max(peak['rss'], rss())
+            peak['disk'] = max(peak['disk'], tree_size(*paths) - base_disk)
+    sampler = threading.Thread(target=sample, daemon=True)
+    cpu, start = time.process_time(), time.monotonic()
+    sampler.start()
+    job_ids = submit()
+    job_ids = [wait(manager, job_id, interval) for job_id in ([job_ids] if isinstance(job_ids, str) else job_ids)]
+    wall, cpu = time.monotonic() - start, time.process_time() - cpu
+    done.set()
+    sampler.join()
+    job = next((j for j in map(manager.job, job_ids) if j['status'] != 'finished'), manager.job(job_ids[-1]))
+    items = [i for job_id in job_ids for i in manager.items(job_id)]
+    size = sum(i['total'] or 0 for i in items)
+    return {'status': job['status'], 'error': job['error'], 'videos': len(items),
+            'failed': sum(i['status'] == 'failed' for i in items), 'wall_s': round(wall, 3), 'cpu_s': round(cpu, 3),
+            'bytes': size, 'mib_s': round(size / 1024 ** 2 / wall, 2) if wall else 0,
+            'peak_rss_mib': round(peak['rss'] / 1024 ** 2, 1), 'peak_disk_mib': round(peak['disk'] / 1024 ** 2, 1),
+            'download_s': round(sum(i['download_time'] or 0 for i in items), 3),
+            'merge_s': round(sum(i['merge_time'] or 0 for i in items), 3),
+            'hook_calls': downloader.hook_stats['calls'] - hook['calls'],
+            'hook_cpu_s_gib': round((downloader.hook_stats['cpu'] - hook['cpu']) / (size / 1024 ** 3), 4) if size else 0}
+
+def serve_files(sizes, interval=0.05):
+    import fileserver
+    files = []
+    for mib in sizes:
+        path = os.path.join(tempfile.gettempdir(), f"serve-{mib}.bin")
+        with open(path, 'wb') as f:
+            f.truncate(mib * 1024 ** 2)
+        files.append((fileserver.publish(path), mib * 1024 ** 2))
+    while True:  # publish starts the server thread
+        try:
+            socket.create_connection(("localhost", fileserver.PORT)).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    base = rss()
+    peak = {'rss': base}
+    done = threading.Event()
+    def sample():
+        while not done.wait(interval):
+            peak['rss'] = max(peak['rss'], rss())
+    sampler = threading.Thread(target=sample, daemon=True)
+    cpu, start = time.process_time(), time.monotonic()
+    sampler.start()
+    fetched, bad = 0, []
+    for url, size in files:
+        for first in (0, size // 2):
+            req = urllib.request.Request(url, headers={'Range': f"bytes={first}-"} if first else {})
+            with urllib.request.urlopen(req) as r:
+                got = 0
+                while chunk := r.read(1024 ** 2):
+                    got += len(chunk)
+            fetched += got
+            if got != size - first or r.status != (206 if first else 200):
+                bad.append(f"{url} from {first}: {r.status}, {got} bytes")
+    wall, cpu = time.monotonic() - start, time.process_time() - cpu
+    done.set()
+    sampler.join()
+    growth = peak['rss'] - base
+    return {'status': 'finished' if not bad and growth <= SERVE_FLAT else 'failed', 'error': "; ".join(bad) or None,
+            'videos': 0, 'failed': 0, 'wall_s': round(wall, 3), 'cpu_s': round(cpu, 3), 'bytes': fetched,
+            'mib_s': round(fetched / 1024 ** 2 / wall, 2) if wall else 0, 'peak_rss_mib': round(peak['rss'] / 1024 ** 2, 1),
+            'rss_growth_mib': round(growth / 1024 ** 2, 1), 'largest_mib': max(sizes)}
+
+def main(argv=None):
+    args = parse_args(argv)
+    root = tempfile.mkdtemp(prefix="yt-bench-")
+    # the app modules read their configuration at import time
+    os.environ.update(JOBS_DB=os.path.join(root, "jobs.db"), MEDIA_CACHE_DIR=os.path.join(root, "cache"),
+                      METRICS_LOG=os.path.join(root, "metrics.jsonl"), FILE_SERVER_DIR=os.path.join(root, "serve"),
+                      FILE_SERVER_PORT=str(free_port()), JOBS_DIR=os.path.join(root, "jobs"))
+    os.environ.setdefault("DISK_HEADROOM", str(256 * 1024 ** 2))
+    os.environ.setdefault("WORKER_LEASE", "3")  # failover: a killed worker's items are taken over after this
+    if not args.cache:
+        os.environ["MEDIA_CACHE_BYTES"] = "0"
+    tempfile.tempdir = os.path.join(root, "tmp")
+    os.makedirs(tempfile.tempdir)
+    scratch = [tempfile.tempdir, os.environ["JOBS_DIR"], os.environ["MEDIA_CACHE_DIR"], os.environ["FILE_SERVER_DIR"]]
+
+    print(f"Generating {args.duration}s of synthetic media in {root} ...", file=sys.stderr)
+    media, vcodec = make_media(os.path.join(root, "media"), args.duration, args.bitrate)
+    base = serve_media(media, args.rate * 1024 ** 2)
+    bench = install_extractor(base, media, vcodec, args.duration, args.page_delay)
+
+    import downloader, fragments, jobs, ydlpool
+    pool = ydlpool.get_pool()
+    tuners = []
+    class Tuner(fragments.FragmentTuner):  # kept after the job ends, for the report
+        def __init__(self, *args):
+            super().__init__(*args)
+            tuners.append(self)
+    fragments.FragmentTuner = Tuner
+    MediaHandler.frag_limit = args.frag_limit
+    manager = jobs.JobManager(os.environ["JOBS_DB"])
+    results = []
+    for workers in [int(w) for w in args.workers.split(",")]:
+        for scenario in args.scenarios.split(","):
+            key = f"{scenario}{workers}"
+            if scenario == 'single':
+                entry = {'id': f"{key}-0", 'title': f"Bench {key}-0"}
+                submit = lambda: manager.submit('video', downloader.watch_url(entry['id']), entry['title'], [entry])
+            elif scenario in ('playlist', 'audio', 'mp3'):
+                bench.listings[key] = args.videos
+                url = f"https://www.youtube.com/playlist?list={key}"
+                audio = {'audio': 'copy', 'mp3': 'mp3'}.get(scenario)
+                fmt = downloader.AUDIO_FORMAT if audio else 'bestvideo+bestaudio'
+                submit = lambda: manager.submit('playlist', url, key, fmt=fmt, workers=workers, audio=audio)
+            elif scenario == 'resume':
+                bench.listings[key] = args.videos
+                total = args.videos * (len(media['video']) + len(media['audio']))
+                spec = {'base': base, 'media': os.path.join(root, "media"), 'vcodec': vcodec, 'duration': args.duration,
+                        'key': key, 'videos': args.videos, 'workers': workers,
+                        'url': f"https://www.youtube.com/playlist?list={key}"}
+                MediaHandler.rate = max(args.rate, RESUME_RATE) * 1024 ** 2
+                submit = lambda: interrupt(manager, spec, total, args.kill_at)
+            elif scenario in ('unpooled', 'pooled'):
+                pool.clear()
+                pool.size = ydlpool.POOL_SIZE if scenario == 'pooled' else 0
+                entries = [{'id': f"{key}-{i}", 'title': f"Bench {key}-{i}"} for i in range(args.videos)]
+                submit = lambda: [wait(manager, manager.submit('video', downloader.watch_url(e['id']), e['title'], [e]))
+                                  for e in entries]
+            elif scenario == 'clip':
+                entry = {'id': f"{key}-0", 'title': f"Bench {key}-0"}
+                clip = {'ranges': [[args.duration * 0.4, args.duration * 0.6]]}
+                MediaHandler.rate = max(args.rate, RESUME_RATE) * 1024 ** 2  # served then tracks what ffmpeg read
+                submit = lambda: manager.submit('video', downloader.watch_url(entry['id']), entry['title'], [entry],
+                                                clip=clip)
+            elif scenario == 'ui':
+                spec = {'base': base, 'media': os.path.join(root, "media"), 'vcodec': vcodec, 'duration': args.duration,
+                        'url': downloader.watch_url(f"{key}-0"), 'reruns': UI_RERUNS}
+                submit = lambda: ui_timings(root, key, spec)
+            elif scenario == 'serve':
+                submit = lambda: serve_files([int(s) for s in args.serve_mib.split(",")])
+            elif scenario in ('distributed', 'failover'):
+                bench.listings[key] = args.videos
+                url = f"https://www.youtube.com/playlist?list={key}"
+                procs = start_workers({'base': base, 'media': os.path.join(root, "media"), 'vcodec': vcodec,
+                                       'duration': args.duration, 'key': key}, workers)
+                if scenario == 'failover':
+                    total = args.videos * (len(media['video']) + len(media['audio']))
+                    MediaHandler.rate = max(args.rate, RESUME_RATE) * 1024 ** 2
+                    submit = lambda: kill_worker(manager, url, key, procs, total, args.kill_at)
+                else:
+                    submit = lambda: manager.submit('playlist', url, key, remote=True)
+            elif scenario in ('segmented1', 'segmented'):
+                key = f"seg{key}"
+                bench.listings[key] = args.videos
+                url = f"https://www.youtube.com/playlist?list={key}"
+                MediaHandler.rate = max(args.rate, SEGMENT_RATE) * 1024 ** 2
+                setting = 1 if scenario == 'segmented1' else 0
+                submit = lambda: manager.submit('playlist', url, key, workers=workers, fragments=setting)
+            else:
+                bench.listings[key] = args.videos
+                url = f"https://www.youtube.com/@{key}/videos"
+                if scenario == 'sync':
+                    measure(manager, lambda: manager.submit('channel', url, key, workers=workers), scratch)
+                    bench.listings[key] += args.new
+                submit = lambda: manager.submit(scenario if scenario == 'sync' else 'channel', url, key, workers=workers)
+            MediaHandler.connections = MediaHandler.rejected = MediaHandler.served = 0
+            result = {'scenario': scenario, 'workers': workers,
+                      **(submit() if scenario in ('ui', 'serve') else measure(manager, submit, scratch)),
+                      'fetched_mib': round(MediaHandler.served / 1024 ** 2, 2)}
+            if scenario == 'clip':
+                MediaHandler.rate = args.rate * 1024 ** 2
+                full = len(media['video']) + len(media['audio'])
+                result.update(full_mib=round(full / 1024 ** 2, 2), saved=f"{1 - MediaHandler.served / full:.0%}")
+            if scenario in ('distributed', 'failover'):
+                MediaHandler.rate = args.rate * 1024 ** 2
+                for proc in procs:
+                    proc.kill()
+                    proc.wait()
+                spread = manager.execute("SELECT COUNT(DISTINCT worker) AS used, SUM(attempts > 1) AS reclaimed FROM items "
+                                         "WHERE job_id = (SELECT id FROM jobs WHERE url = ?)", url)[0]
+                result.update(worker_procs=spread['used'], reclaimed=spread['reclaimed'])
+            if scenario in ('segmented1', 'segmented'):
+                MediaHandler.rate = args.rate * 1024 ** 2
+                result.update(fragments=tuners[-1].level, backoffs=tuners[-1].backoffs, rejected=MediaHandler.rejected)
+            if scenario in ('unpooled', 'pooled'):
+                pool.size = ydlpool.POOL_SIZE
+                result.update(item_ms=round(result['wall_s'] * 1000 / max(result['videos'], 1), 1),
+                              connections=MediaHandler.connections)
+            if scenario == 'resume':
+                MediaHandler.rate = args.rate * 1024 ** 2
+                # a killed worker loses at most the block it had read but not yet written
+                refetched = MediaHandler.served - total
+                result.update(killed_at_mib=round(spec['killed_at'] / 1024 ** 2, 1),
+                              refetched_mib=round(refetched / 1024 ** 2, 2), resumed=refetched <= workers * 2 * 1024 ** 2)
+            results.append(result)
+            print(json.dumps(result), file=sys.stderr)
+            shutil.rmtree(os.environ["FILE_SERVER_DIR"], ignore_errors=True)  # published outputs
+            os.makedirs(os.environ["FILE_SERVER_DIR"], exist_ok=True)
+
+    columns = ['scenario', 'workers', 'videos', 'failed', 'status', 'wall_s', 'mib_s', 'cpu_s', 'peak_rss_mib',
+               'peak_disk_mib', 'download_s', 'merge_s', 'refetched_mib', 'item_ms', 'connections', 'fragments',
+               'backoffs', 'fetched_mib', 'full_mib', 'saved', 'cold_ms', 'rerun_ms', 'open_ms', 'open_rerun_ms',
+               'worker_procs', 'reclaimed', 'largest_mib', 'rss_growth_mib', 'hook_calls', 'hook_cpu_s_gib']
+    print(" ".join(f"{c:>13}" for c in columns))
+    for r in results:
+        print(" ".join(f"{r.get(c, ''):>13}" for c in columns))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if not args.keep:
+        shutil.rmtree(root, ignore_errors=True)
+    return 0 if all(r['status'] == 'finished' and not r['failed'] and r.get('resumed', True) for r in results) else 1
+
+if __name__ == "__main__":
+    if os.environ.get("BENCH_CHILD"):
+        child(json.loads(os.environ["BENCH_CHILD"]))
+    if os.environ.get("BENCH_UI"):
+        sys.exit(ui_child(json.loads(os.environ["BENCH_UI"])))
+    if os.environ.get("BENCH_WORKER"):
+        sys.exit(worker_child(json.loads(os.environ["BENCH_WORKER"])))
+    sys.exit(main())
@@ -0,0 +1,77 @@
+import os, shutil, threading
+
+# Downloads reserve their estimated size on every volume they write to before the first byte is
+# fetched. A reservation is granted only if the volume's free space, minus what running downloads
+# have reserved but not written yet, minus HEADROOM (merges briefly need parts + output), covers it.
+HEADROOM = int(os.environ.get("DISK_HEADROOM", 2 * 1024 ** 3))
+
+class DiskFull(Exception):
+    pass
+
+class Reservation:
+    def __init__(self, budget, devices, size):
+        self.budget, self.devices, self.size, self.written = budget, devices, size, 0
+
+    def outstanding(self): return max(self.size - self.written, 0)
+
+    def __enter__(self): return self
+
+    def __exit__(self, *exc):
+        self.budget.release(self)
+
+class DiskBudget:
+    def __init__(self, headroom=HEADROOM):
+        self.headroom = headroom
+        self.lock = threading.Lock()
+        self.active = []
+        self.stats = {'reserved': 0, 'written': 0, 'rejected': 0}
+
+    def _pending(self, dev): return sum(r.outstanding() for r in self.active if dev in r.devices)
+
+    # Free bytes on the tightest volume behind paths, after outstanding reservations and headroom.
+    def free(self, *paths):
+        with self.lock:
+            return min(self._free(self._devices(paths)).values())
+
+    def _devices(self, paths):
+        devices = {}
+        for p in paths:
+            os.makedirs(p, exist_ok=True)
+            devices.setdefault(os.stat(p).st_dev, p)
+        return devices
+
+    def _free(self, devices):
+        return {p: shutil.disk_usage(p).free - self._pending(dev) - self.headroom for dev, p in devices.items()}
+
+    def reserve(self, size, *paths):
+        with self.lock:
+            devices = self._devices(paths)
+            short = [(p, free) for p, free in self._free(devices).items() if free < size]
+            if short:
+                self.stats['rejected'] += 1
+                p, free = short[0]
+                raise DiskFull(f"Not enough disk space: needs ~{size / 1024 ** 2:.0f} MiB, "
+                               f"{max(free, 0) / 1024 ** 2:.0f} MiB available on {p}")
+            reservation = Reservation(self, set(devices), size)
+            self.active.append(reservation)
+            self.stats['reserved'] += size
+            return reservation
+
+    def release(self, reservation):
+        with self.lock:
+            self.active.remove(reservation)
+            self.stats['written'] += reservation.written
+
+    def usage(self):
+        with self.lock:
+            return len(self.active), sum(r.outstanding() for r in self.active)
+
+_budget = None
+_budget_lock = threading.Lock()
+
+def get_budget():
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = DiskBudget()
+        return _budget
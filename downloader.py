@@ -0,0 +1,445 @@
+import os, re, copy, time, zipfile, queue, threading, subprocess
+from contextlib import nullcontext, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import formatselect, diskspace, fragments, ydlpool
+
+VIDEO_TEMPLATE = "%(title).200s [%(id)s].%(ext)s"
+CLIP_SUFFIX = " [%(section_start)ds-%(section_end)ds]"  # one file per range, named by its bounds
+PROGRESS_INTERVAL = 0.5  # yt-dlp can call progress hooks hundreds of times a second
+POSTPROCESS_WORKERS = int(os.environ.get("POSTPROCESS_WORKERS", 2))
+AUDIO_FORMAT = 'bestaudio'  # the best audio-only format
+TRANSCODE = {'mp3': ('libmp3lame', 2)}  # audio output -> (ffmpeg encoder, VBR quality, 0 is best)
+AUDIO_OUTPUTS = ('copy', *TRANSCODE)
+PIPE_CHUNK = 64 * 1024
+# Progress hook calls and the CPU time spent in them, summed over every download (see benchmark.py).
+hook_stats = {'calls': 0, 'cpu': 0.0}
+_hook_lock = threading.Lock()
+# ZipInfo fields journaled per archived entry, enough to write its central directory record again.
+ZIP_FIELDS = ('filename', 'date_time', 'header_offset', 'CRC', 'file_size', 'compress_size', 'compress_type',
+              'external_attr', 'extract_version', 'create_version', 'flag_bits')
+
+def watch_url(video_id): return f"https://www.youtube.com/watch?v={video_id}"
+
+# Normalize a URL to the ID yt-dlp would resolve it to, so that watch?v=, youtu.be/ and
+# shorts/ links to the same video (or playlist/channel tab) share one key.
+def url_key(url, flat=False):
+    url = url.strip()
+    m = re.search(r'[?&]list=([\w-]+)', url) if flat else None
+    m = m or re.search(r'(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/)([\w-]{11})', url)
+    if m:
+        return m.group(1)
+    return re.sub(r'^(?:https?://)?(?:www\.|m\.)?', '', url).rstrip('/').lower()
+
+def sanitize_filename(title): return re.sub(r'[^\w\-_\. ]', '_', title)
+
+# Key of an output in the media cache and the sync archive: one format extracted to another codec is another file.
+def output_key(fmt, audio=None): return f"{fmt}>{audio}" if audio else fmt
+
+# Yields a playlist/channel listing entry by entry. process=False keeps yt-dlp's entries lazy, so
+# the next page is only fetched once the previous one has been consumed. on_info gets the
+# playlist/channel info (title etc.) before the first entry. With archived ids, iteration stops
+# at the first upload that is already archived; listings are newest first. Ids in missed (uploads an
+# earlier run failed) are older than that stop, so until all of them have come by, archived uploads are
+# skipped instead and listing goes on.
+def iter_entries(url, archived=(), on_info=None, missed=()):
+    missed = set(missed)
+    with ydlpool.get_pool().lease(extract_flat=True) as ydl:
+        info = ydl.extract_info(url, download=False, process=False)
+        while info.get('_type') in ('url', 'url_transparent'):
+            info = ydl.extract_info(info['url'], download=False, process=False)
+        if on_info:
+            on_info(info)
+        for entry in info.get('entries') or []:
+            if not entry:
+                continue
+            if entry['id'] in archived:
+                if not missed:
+                    return
+                continue
+            missed.discard(entry['id'])
+            yield entry
+
+# The unprocessed info of a single video: id, title and formats, without resolving any stream.
+def fetch_entry(url):
+    with ydlpool.get_pool().lease() as ydl:
+        return ydl.extract_info(url, download=False, process=False)
+
+# Merges overlapping or touching (start, end) ranges in seconds, e.g. adjacent chapters.
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+# clip = {'ranges': [[start, end], ...], 'precise': bool} keeps only those parts of the video. yt-dlp
+# hands ranges to ffmpeg, which seeks its HTTP inputs, so only the bytes around each range are
+# fetched. Cuts are stream copies from the keyframe before each start unless precise re-encodes them.
+# audio ('copy' or a TRANSCODE output) makes an audio-only file from fmt, normally AUDIO_FORMAT. 'copy'
+# keeps the stream as it is: m4a stays m4a and WebM is remuxed into .opus. A TRANSCODE output is
+# encoded by the worker while the stream downloads (see transcode_audio); the FFmpegExtractAudio
+# postprocessor only converts what could not be piped.
+def download_opts(outdir, fmt='bestvideo+bestaudio', outtmpl=VIDEO_TEMPLATE, clip=None, audio=None):
+    if clip:
+        from yt_dlp.utils import download_range_func  # yt_dlp is imported on first use, see ydlpool
+        outtmpl = outtmpl[:-len('.%(ext)s')] + CLIP_SUFFIX + '.%(ext)s'
+        clip = {'download_ranges': download_range_func(None, clip['ranges']),
+                'force_keyframes_at_cuts': bool(clip.get('precise'))}
+    if audio:
+        codec, quality = ('best', None) if audio == 'copy' else (audio, TRANSCODE[audio][1])
+        audio = {'postprocessors': [{'key': 'FFmpegExtractAudio', 'preferredcodec': codec, 'preferredquality': quality}]}
+    return {
+        'format': fmt,
+        'merge_output_format': formatselect.MERGE_CONTAINERS,
+        'outtmpl': os.path.join(outdir, outtmpl),
+        'quiet': True,
+        'noprogress': True,  # progress reaches the UI through hooks; quiet alone still prints the bar
+        'skip_unavailable_fragments': False,  # fail the item rather than leave a hole in the file
+        'fragment_retries': fragments.RETRIES,  # the embedded default is no retries at all
+        'retry_sleep_functions': {'fragment': fragments.retry_sleep},
+        **(clip or {}),
+        **(audio or {})
+    }
+
+# With admit, the info is extracted first and admit(info) is held around the actual download,
+# so a download can be refused before any media bytes are fetched. transcode(ydl, info) gets the
+# selected format first and replaces yt-dlp's own download when it returns a file.
+def download_video(ydl, video_url, admit=None, transcode=None):
+    try:
+        if not admit and not transcode:
+            return ydl.extract_info(video_url, download=True), None
+        info = ydl.extract_info(video_url, download=False, process=False)
+        with admit(info) if admit else nullcontext():
+            if transcode:
+                chosen = ydl.process_ie_result(copy.deepcopy(info), download=False)
+                if transcode(ydl, chosen):
+                    return chosen, None
+            return ydl.process_ie_result(info, download=True), None
+    except Exception as e:
+        return None, str(e)
+
+# Encodes a selected audio format to a TRANSCODE output while it downloads: the HTTP body is piped
+# straight into ffmpeg, so neither the source stream nor an intermediate file lands on disk. YouTube's
+# audio-only formats are WebM or fragmented MP4, both readable from a pipe. Segmented (DASH/HLS) formats
+# are not one body; for those None is returned and yt-dlp downloads and converts them instead.
+# Like yt-dlp's own downloader, the body is requested in Range chunks of the format's http_chunk_size
+# (YouTube throttles longer requests). progress gets yt-dlp style progress dicts, and yt-dlp's
+# ratelimit param is kept to.
+def transcode_audio(ydl, info, audio, progress):
+    if info.get('protocol') not in ('http', 'https') or info.get('requested_formats'):
+        return None
+    from yt_dlp.networking import Request
+    dest = ydl.prepare_filename(dict(info, ext=audio))
+    tmp = f"{dest}.temp.{audio}"
+    encoder, quality = TRANSCODE[audio]
+    proc = subprocess.Popen(['ffmpeg', '-y', '-loglevel', 'error', '-i', 'pipe:0', '-vn', '-c:a', encoder,
+                             '-q:a', str(quality), tmp], stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    chunk_size = (info.get('downloader_options') or {}).get('http_chunk_size')
+    start, done, total = time.monotonic(), 0, None
+    try:
+        while True:
+            headers = dict(info.get('http_headers') or {})
+            if chunk_size:
+                headers['Range'] = f"bytes={done}-{done + chunk_size - 1}"
+            first = done
+            with ydl.urlopen(Request(info['url'], headers=headers)) as resp:
+                whole = resp.status != 206  # no Range was sent or the server ignored it: the entire body
+                if not total:
+                    size = resp.headers.get('Content-Length' if whole else 'Content-Range', '').rpartition('/')[2]
+                    total = int(size) if size.isdigit() else info.get('filesize')
+                while chunk := resp.read(PIPE_CHUNK):
+                    proc.stdin.write(chunk)
+                    done += len(chunk)
+                    limit, elapsed = ydl.params.get('ratelimit'), time.monotonic() - start
+                    if limit and done / limit > elapsed:
+                        time.sleep(done / limit - elapsed)
+                    speed = done / max(time.monotonic() - start, 1e-3)
+                    progress({'status': 'downloading', 'downloaded_bytes': done, 'total_bytes': total, 'speed': speed,
+                              'eta': (total - done) / speed if total else None})
+            if whole or done - first < chunk_size or (total and done >= total):
+                break
+    except BrokenPipeError:
+        pass  # ffmpeg stopped reading; its error is raised below
+    except BaseException:
+        proc.kill()
+        proc.communicate()
+        raise
+    err = proc.communicate()[1]
+    if proc.returncode:
+        raise RuntimeError(f"Transcode failed: {err.decode(errors='replace').strip()}")
+    os.replace(tmp, dest)
+    progress({'status': 'finished', 'downloaded_bytes': done, 'total_bytes': done})
+    return dest
+
+# "A+B" is downloaded as "A,B" (two separate files, no merge inside yt-dlp) so the merge can run
+# in the post-processing pool while the worker moves on to the next entry.
+def split_format(fmt):
+    parts = fmt.split('+')
+    return ','.join(parts) if len(parts) == 2 and '/' not in fmt else None
+
+def part_template(outtmpl):
+    return outtmpl[:-len('.%(ext)s')] + '.f%(format_id)s.%(ext)s'
+
+def merge_streams(video_path, audio_path, dest):
+    tmp = f"{dest}.temp{os.path.splitext(dest)[1]}"
+    subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-i', video_path, '-i', audio_path,
+                    '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy', tmp], check=True, capture_output=True)
+    os.replace(tmp, dest)
+    os.remove(video_path)
+    os.remove(audio_path)
+
+# Second pipeline stage: stream-copies the downloaded parts of one entry into a container both
+# codecs fit, then reports the file exactly like yt-dlp's own post_hooks would.
+def merge_entry(events, idx, video_id, info, fmt, cache=None):
+    try:
+        known = {f['format_id']: f for f in info.get('formats') or []}
+        parts = [{**known.get(p.get('format_id'), {}), **p} for p in info['requested_downloads']]
+        video = next(p for p in parts if p.get('vcodec') not in (None, 'none'))
+        audio = next(p for p in parts if p is not video)
+        dest = video['filepath'].rsplit(f".f{video['format_id']}.", 1)[0] + f".{formatselect.container(video, audio)}"
+        start = time.monotonic()
+        merge_streams(video['filepath'], audio['filepath'], dest)
+        events.put(('timing', idx, {'stage': 'merge', 'seconds': time.monotonic() - start,
+                                    'bytes': os.path.getsize(dest)}))
+        if cache:
+            cache.store(video_id, fmt, dest)
+        events.put(('file', idx, dest))
+        events.put(('done', idx, None))
+    except subprocess.CalledProcessError as e:
+        events.put(('done', idx, f"Merge failed: {e.stderr.decode(errors='replace').strip()}"))
+    except Exception as e:
+        events.put(('done', idx, f"Merge failed: {e}"))
+
+# Each worker leases one pooled YoutubeDL instance (see ydlpool) for the whole listing, so cookies and
+# connections are reused from item to item, and pulls entries until it gets the None sentinel.
+# Progress (at most one update per progress_interval), finished files and results are sent back
+# as events to the calling thread. With split=True, two-part formats are downloaded without
+# merging and handed over as a 'downloaded' event for the post-processing pool.
+# With a media cache, hits are linked into outdir instead of downloaded and new files are stored.
+# slots(ydl) is a context manager held around each network download (see scheduler.Scheduler.slot).
+# With a disk budget, each download reserves its estimated size on the output and cache volumes
+# first; once one does not fit, halt is set and the remaining entries are skipped.
+# With a tuner (see fragments.FragmentTuner), segmented formats are fetched with its current
+# number of parallel fragments and each segmented download's throughput is reported back to it.
+# audio is the output download_opts was given; a TRANSCODE output is piped through ffmpeg
+# (transcode_audio) unless the video is clipped.
+def download_worker(jobs, events, opts, cache=None, progress_interval=PROGRESS_INTERVAL, split=False, slots=None,
+                    disk=None, halt=None, tuner=None, audio=None):
+    current = {'sent': 0}
+    fmt, key = opts['format'], output_key(opts['format'], audio)
+    volumes = [os.path.dirname(opts['outtmpl'])] + ([cache.path] if cache else [])
+    clip = opts.get('download_ranges')
+    def progress(d):
+        start = time.thread_time()  # this thread's CPU only, not the other downloads'
+        report(d)
+        current['hook_calls'] += 1
+        current['hook_cpu'] += time.thread_time() - start
+    def report(d):
+        if d.get('fragment_count') and not current['segmented']:
+            current['segmented'] = time.monotonic()
+        # downloaded_bytes restarts at zero for the audio part of a two-part download, so the reservation
+        # counts it on top of the parts already finished (current['bytes'], as item_event's part_bytes)
+        if current.get('reservation'):
+            written = current['bytes'] + (d.get('downloaded_bytes') or 0)
+            current['reservation'].written = max(current['reservation'].written, written)
+        if d['status'] == 'finished':
+            current['bytes'] += d.get('total_bytes') or d.get('downloaded_bytes') or 0
+        now = time.monotonic()
+        if d['status'] == 'downloading' and now - current['sent'] < progress_interval:
+            return
+        current['sent'] = now
+        events.put(('progress', current['idx'], d))
+    def postprocess(d):
+        if d['postprocessor'] == 'Merger' and d['status'] == 'started':
+            current['merge'] = time.monotonic()
+        elif d['postprocessor'] == 'Merger' and d['status'] == 'finished':
+            events.put(('timing', current['idx'], {'stage': 'merge', 'seconds': time.monotonic() - current['merge']}))
+    def finished(path):
+        if cache:
+            cache.store(current['id'], key, path)
+        events.put(('file', current['idx'], path))
+    def transcode(ydl, info):
+        path = transcode_audio(ydl, info, audio, progress)
+        if path:
+            finished(path)
+        return path
+    @contextmanager
+    def admit(info):
+        now = time.monotonic()
+        events.put(('timing', current['idx'], {'stage': 'extract', 'seconds': now - current['start']}))
+        current['start'] = now
+        chosen = sizer.process_ie_result(copy.deepcopy(info), download=False)
+        size = formatselect.estimate_size(chosen.get('requested_formats') or [chosen], chosen.get('duration'))
+        if clip and chosen.get('duration'):
+            events.put(('full_size', current['idx'], size))
+            size = int(size * min(sum(end - start for start, end in clip.ranges) / chosen['duration'], 1))
+        events.put(('estimate', current['idx'], size))
+        try:
+            reservation = disk.reserve(size, *volumes)
+        except diskspace.DiskFull:
+            halt.set()
+            raise
+        with reservation:
+            current['reservation'] = reservation
+            try:
+                yield
+            finally:
+                current['reservation'] = None
+    opts = dict(opts, progress_hooks=[progress], postprocessor_hooks=[postprocess])
+    if tuner:
+        opts['logger'] = fragments.ThrottleLogger(tuner)
+    split = split and split_format(fmt)
+    final = opts['outtmpl']  # cache hits are named like a merged download, not like its parts
+    if split:
+        opts.update(format=split, outtmpl=part_template(final))
+    else:
+        opts['post_hooks'] = [finished]
+    piped = transcode if audio in TRANSCODE and not clip else None
+    pool = ydlpool.get_pool()
+    # the sizer resolves the unsplit format, so estimates cover both halves of a merge
+    with pool.lease(**opts) as ydl, pool.lease(format=fmt) if disk else nullcontext() as sizer:
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            idx, video = job
+            current.update(idx=idx, id=video['id'])
+            if halt and halt.is_set():
+                events.put(('done', idx, "Skipped: not enough disk space left for this job"))
+                continue
+            path = cache and cache.fetch(video['id'], key,
+                                         lambda ext: ydl.prepare_filename(dict(video, ext=ext), outtmpl=final))
+            if path:
+                events.put(('progress', idx, {'status': 'finished', 'cached': True}))
+                events.put(('file', idx, path))
+                events.put(('done', idx, None))
+                continue
+            if tuner:
+                ydl.params['concurrent_fragment_downloads'] = level = tuner.level
+            with slots(ydl) if slots else nullcontext():
+                current.update(start=time.monotonic(), bytes=0, segmented=None, hook_calls=0, hook_cpu=0.0)
+                info, err = download_video(ydl, watch_url(video['id']), disk and admit, piped)
+                if err and 'HTTP Error 416' in err:
+                    # a .part completed just before a restart cannot be resumed by yt-dlp; fetch it afresh
+                    ydl.params['continuedl'] = False
+                    info, err = download_video(ydl, watch_url(video['id']), disk and admit, piped)
+                    ydl.params['continuedl'] = True
+            events.put(('timing', idx, {'stage': 'download', 'seconds': time.monotonic() - current['start'],
+                                        'bytes': current['bytes']}))
+            with _hook_lock:
+                hook_stats['calls'] += current['hook_calls']
+                hook_stats['cpu'] += current['hook_cpu']
+            if tuner and current['segmented'] and not err:
+                tuner.record(level, current['bytes'], time.monotonic() - current['segmented'])
+            if split and not err:
+                events.put(('downloaded', idx, info))
+            else:
+                events.put(('done', idx, err))
+
+# Feeds entries (any iterable, e.g. a lazily paginated listing) into a bounded queue so downloads
+# start with the first page and the listing never runs far ahead of the workers.
+def produce_entries(entries, jobs, events, workers, stop, halt, finished=()):
+    def put(item):
+        while not stop.is_set():
+            try:
+                return jobs.put(item, timeout=0.5)
+            except queue.Full:
+                pass
+    try:
+        for idx, video in enumerate(entries, 1):
+            events.put(('entry', idx, video))
+            if idx in finished:
+                events.put(('done', idx, None))
+                continue
+            put((idx, video))
+            if stop.is_set() or halt.is_set():
+                return
+    except Exception as e:
+        events.put(('listing', 0, str(e)))
+    finally:
+        for _ in range(workers):
+            put(None)
+
+# Downloads entries with a bounded pool and calls on_event(kind, idx, payload) from the
+# calling thread for every 'entry', 'progress', 'timing', 'file' and 'done' event,
+# and for a 'listing' error if iterating entries fails. Merges run in a separate pool of
+# postprocess_workers so they overlap with the next downloads. Workers wait for one of the
+# slots before each download and, with a disk budget, reserve space for it ('estimate' events, and
+# 'full_size' with the whole video's size when clipping, carry the expected size); the listing stops
+# at the first entry that does not fit.
+# Indexes in finished were completed by an earlier run and are reported done without a download.
+# tuner is the job's fragments.FragmentTuner for segmented formats, shared by all workers. audio is
+# the audio-only output opts were made for (see download_opts); it also keys the media cache.
+# Returns {idx: error or None}.
+def download_entries(entries, opts, workers=4, on_event=None, cache=None, progress_interval=PROGRESS_INTERVAL,
+                     postprocess_workers=POSTPROCESS_WORKERS, slots=None, disk=None, finished=(), tuner=None,
+                     audio=None):
+    jobs, events, stop, halt = queue.Queue(maxsize=workers * 2), queue.Queue(), threading.Event(), threading.Event()
+    split = postprocess_workers > 0
+    threads = [threading.Thread(target=download_worker, args=(jobs, events, opts, cache, progress_interval, split, slots,
+                                                           disk, halt, tuner, audio),
+                                daemon=True)
+               for _ in range(workers)]
+    for t in threads:
+        t.start()
+    threading.Thread(target=produce_entries, args=(entries, jobs, events, workers, stop, halt, finished),
+                     daemon=True).start()
+
+    announced, merging, results = {}, set(), {}
+    with ThreadPoolExecutor(max_workers=max(postprocess_workers, 1), thread_name_prefix="merge") as merges:
+        while True:
+            try:
+                kind, idx, payload = events.get(timeout=0.5)
+            except queue.Empty:
+                if not merging and not any(t.is_alive() for t in threads) and events.empty():
+                    break
+                continue
+            if kind == 'entry':
+                announced[idx] = payload
+            elif kind == 'downloaded':
+                merging.add(idx)
+                merges.submit(merge_entry, events, idx, announced[idx]['id'], payload, opts['format'], cache)
+                continue
+            elif kind == 'done':
+                merging.discard(idx)
+                results[idx] = payload
+            if on_event:
+                on_event(kind, idx, payload)
+    stop.set()
+
+    for idx in sorted(announced.keys() - results.keys()):
+        results[idx] = "Worker exited before this entry was downloaded"
+        if on_event:
+            on_event('done', idx, results[idx])
+    return results
+
+# Videos are already compressed, so entries are stored as-is; ZIP64 keeps >4 GiB channels valid.
+# Each finished file is moved into the archive right away so disk use stays around one copy.
+# members are the entries an earlier run journaled (see archive_file): the archive is cut after the
+# last of them, dropping a half-written entry and the central directory a kill never wrote, and they
+# are listed again without copying anything.
+def open_zip(path, members=()):
+    end = max((m['end'] for m in members), default=0)
+    if end:
+        with open(path, 'r+b') as f:
+            f.truncate(end)
+    zipf = zipfile.ZipFile(path, 'a' if end else 'w', compression=zipfile.ZIP_STORED, allowZip64=True)
+    for m in sorted(members, key=lambda m: m['header_offset']):
+        info = zipfile.ZipInfo()
+        for field in ZIP_FIELDS:
+            setattr(info, field, m[field])
+        info.date_time = tuple(info.date_time)
+        zipf.filelist.append(info)
+        zipf.NameToInfo[info.filename] = info
+    return zipf
+
+# journal(member) is called once the entry is on disk and before its source is removed.
+def archive_file(zipf, path, journal=None):
+    zipf.write(path, arcname=os.path.basename(path))
+    zipf.fp.flush()
+    if journal:
+        info = zipf.filelist[-1]
+        journal({**{field: getattr(info, field) for field in ZIP_FIELDS}, 'end': zipf.fp.tell()})
+    os.remove(path)
@@ -0,0 +1,131 @@
+import os, time, uuid, shutil, tempfile, threading, asyncio
+import tornado.escape, tornado.ioloop, tornado.web
+import metrics
+
+# Finished files are served from disk by Tornado's StaticFileHandler, which streams in 64 KiB chunks
+# and answers Range requests, so large ZIPs never sit in process memory and interrupted browser
+# downloads can resume. Deployed through start.sh, launch.py mounts /files/ on Streamlit's own app,
+# so links go through the one public port; otherwise (batch runs, a bare `streamlit run`) they point
+# at a small Tornado app on PORT, which also serves /metrics in Prometheus text format and the
+# JSON job API under /api/ (see api.py). FILE_SERVER_URL overrides the public base of the links.
+# That app listens on localhost only unless FILE_SERVER_HOST says otherwise (then set API_TOKEN).
+# Every published file gets its own token directory, so equal names never collide. A file is
+# deleted RETENTION seconds after it was last requested, or earlier, least recently requested
+# first, once published files exceed RETENTION_BYTES.
+PORT = int(os.environ.get("FILE_SERVER_PORT", 8502))
+HOST = os.environ.get("FILE_SERVER_HOST", "127.0.0.1")
+PUBLIC_URL = os.environ.get("FILE_SERVER_URL", "").rstrip("/")
+LOCAL_URL = f"http://localhost:{PORT}"
+SERVE_DIR = os.environ.get("FILE_SERVER_DIR", os.path.join(tempfile.gettempdir(), "yt-download-serve"))
+RETENTION = int(os.environ.get("FILE_RETENTION", 60 * 60))
+RETENTION_BYTES = int(os.environ.get("FILE_RETENTION_BYTES", 20 * 1024 ** 3))
+
+_files = {}  # token -> [path, expires_at, size]
+_lock = threading.Lock()
+_thread = None
+_mounted = None  # URL path prefix of /files/ on Streamlit's app, once mounted
+
+class FileHandler(tornado.web.StaticFileHandler):
+    def prepare(self):
+        self.sent = 0
+
+    def write(self, chunk):
+        self.sent += len(chunk)
+        super().write(chunk)
+
+    def on_finish(self):
+        if self.request.method == "GET":
+            metrics.get_metrics().observe('serve', self.request.request_time(), self.sent, status=self.get_status())
+
+    @classmethod
+    def get_absolute_path(cls, root, token):
+        with _lock:
+            entry = _files.get(token)
+            if not entry:
+                return ""
+            entry[1] = time.time() + RETENTION  # keep the file while a download is still resuming
+            return entry[0]
+
+    def validate_absolute_path(self, root, absolute_path):
+        if not absolute_path or not os.path.isfile(absolute_path):
+            raise tornado.web.HTTPError(404)
+        return absolute_path
+
+    @classmethod
+    def get_content_version(cls, abs_path):
+        st = os.stat(abs_path)  # the default hashes the whole file
+        return f"{st.st_size}-{int(st.st_mtime)}"
+
+    def set_extra_headers(self, path):
+        name = tornado.escape.url_escape(os.path.basename(self.absolute_path), plus=False)
+        self.set_header("Content-Disposition", f"attachment; filename*=UTF-8''{name}")
+        self.set_header("Cache-Control", "private, no-transform")
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(metrics.get_metrics().render())
+
+# keep is a token just published; it is never evicted to make room, even if it alone exceeds the budget.
+def reap(budget=RETENTION_BYTES, keep=None):
+    now = time.time()
+    with _lock:
+        expired = [t for t, (_, expires, _) in _files.items() if expires < now]
+        total = sum(size for t, (_, _, size) in _files.items() if t not in expired)
+        for t, (_, _, size) in sorted(_files.items(), key=lambda f: f[1][1]):
+            if total <= budget:
+                break
+            if t not in expired and t != keep:
+                expired.append(t)
+                total -= size
+        for t in expired:
+            del _files[t]
+    for t in expired:
+        shutil.rmtree(os.path.join(SERVE_DIR, t), ignore_errors=True)
+
+# Adds the file route to Streamlit's Tornado app (see launch.py); added handlers take
+# precedence over its catch-all static route.
+def mount(app, base=""):
+    global _mounted
+    from streamlit.web.server.server_util import make_url_path_regex
+    app.add_handlers(r".*$", [(make_url_path_regex(base, r"files/([\w-]+)(?:/.*)?"), FileHandler, {"path": SERVE_DIR})])
+    _mounted = f"/{base.strip('/')}" if base.strip('/') else ""
+
+def base_url():
+    return PUBLIC_URL or (_mounted if _mounted is not None else LOCAL_URL)
+
+def usage():
+    with _lock:
+        return len(_files), sum(size for _, _, size in _files.values())
+
+def start():
+    global _thread
+    with _lock:
+        if _thread:
+            return
+        _thread = threading.Thread(target=lambda: asyncio.run(_serve()), name="fileserver", daemon=True)
+    shutil.rmtree(SERVE_DIR, ignore_errors=True)
+    os.makedirs(SERVE_DIR, exist_ok=True)
+    _thread.start()
+
+async def _serve():
+    import api  # imports jobs, which imports this module
+    app = tornado.web.Application([(r"/files/([\w-]+)(?:/.*)?", FileHandler, {"path": SERVE_DIR}),
+                                   (r"/metrics", MetricsHandler), *api.ROUTES])
+    app.listen(PORT, HOST)
+    tornado.ioloop.PeriodicCallback(reap, 60 * 1000).start()
+    await asyncio.Event().wait()
+
+# Moves a finished file out of its working/temp directory and returns a download URL. Across
+# filesystems the move is a copy, so it lands under a temporary name and is renamed into place.
+def publish(path, name=None):
+    start()
+    token = uuid.uuid4().hex
+    name = name or os.path.basename(path)
+    os.makedirs(os.path.join(SERVE_DIR, token))
+    dest = os.path.join(SERVE_DIR, token, name)
+    os.replace(shutil.move(path, os.path.join(SERVE_DIR, token, f".{token}.part")), dest)
+    with _lock:
+        _files[token] = [dest, time.time() + RETENTION, os.path.getsize(dest)]
+    reap(keep=token)
+    return f"{base_url()}/files/{token}/{tornado.escape.url_escape(name, plus=False)}"
@@ -0,0 +1,74 @@
+# Containers handed to yt-dlp as merge_output_format: it picks the first one that can hold the
+# chosen codecs, so the ffmpeg merge is always a stream copy and never a re-encode.
+MERGE_CONTAINERS = "mp4/webm/mkv"
+TARGET = "mp4"
+CODEC_RANK = {'avc1': 4, 'h264': 4, 'av01': 3, 'hev1': 2, 'hvc1': 2, 'vp09': 1, 'vp9': 1}
+
+def codec(name): return (name or 'none').split('.')[0].lower()
+
+def is_video(f): return f.get('vcodec') not in (None, 'none') and f.get('acodec') == 'none'
+def is_audio(f): return f.get('vcodec') == 'none' and f.get('acodec') not in (None, 'none')
+
+def container(video, audio, preferences=MERGE_CONTAINERS):
+    from yt_dlp.utils import get_compatible_ext  # yt_dlp is imported on first use, see ydlpool
+    return get_compatible_ext(vcodecs=[video.get('vcodec')], acodecs=[audio.get('acodec')],
+                              vexts=[video['ext']], aexts=[audio['ext']], preferences=preferences.split('/'))
+
+# Indexes formats by (container, codec, resolution) and keeps the best bitrate in each group, so
+# near-identical rows (same stream over https and dash, duplicate itags) collapse into one.
+def index_formats(formats):
+    index = {}
+    for f in formats:
+        if is_video(f):
+            key = ('video', f['ext'], codec(f.get('vcodec')), f.get('height') or 0, round(f.get('fps') or 0))
+        elif is_audio(f):
+            key = ('audio', f['ext'], codec(f.get('acodec')))
+        else:
+            continue
+        if key not in index or (f.get('tbr') or 0) > (index[key].get('tbr') or 0):
+            index[key] = f
+    return index
+
+# Returns one pair per (resolution, fps, container), best first. A pair only lands in a
+# container both streams can be copied into; the TARGET container wins ties at equal quality.
+def ranked_pairs(formats):
+    index = index_formats(formats)
+    videos = [f for k, f in index.items() if k[0] == 'video']
+    audios = sorted((f for k, f in index.items() if k[0] == 'audio'), key=lambda f: f.get('abr') or f.get('tbr') or 0, reverse=True)
+
+    best = {}
+    for v in videos:
+        for a in audios:
+            ext = container(v, a)
+            key = (v.get('height') or 0, round(v.get('fps') or 0), ext)
+            rank = (CODEC_RANK.get(codec(v.get('vcodec')), 0), v.get('tbr') or 0, a.get('abr') or 0)
+            if key not in best or rank > best[key]['rank']:
+                best[key] = {'video': v, 'audio': a, 'container': ext, 'rank': rank}
+
+    # mkv only accepts a pair no other container can hold; drop it where mp4/webm exists
+    native = {k[:2] for k in best if k[2] != 'mkv'}
+    pairs = [p for k, p in best.items() if k[2] != 'mkv' or k[:2] not in native]
+    return sorted(pairs, key=lambda p: (
+        p['video'].get('height') or 0,
+        round(p['video'].get('fps') or 0),
+        p['container'] == TARGET,
+        p['rank']
+    ), reverse=True)
+
+# Expected bytes on disk for the given formats; the bitrate fills in when no size is reported.
+def estimate_size(formats, duration=None):
+    return sum(f.get('filesize') or f.get('filesize_approx') or (f.get('tbr') or 0) * 125 * (duration or 0)
+               for f in formats)
+
+# The audio-only format bestaudio is expected to pick, for sizing and labels.
+def best_audio(formats):
+    return max((f for f in formats if is_audio(f)), key=lambda f: f.get('abr') or f.get('tbr') or 0, default=None)
+
+def audio_label(f): return f"{f['ext']} | {codec(f.get('acodec'))} | {f.get('abr') or 'N/A'} kbps | {f['format_id']}"
+
+def pair_label(pair):
+    v, a = pair['video'], pair['audio']
+    fps = round(v.get('fps') or 0)
+    return (f"{v.get('height', 'N/A')}p{fps if fps > 30 else ''} | {pair['container']} | "
+            f"{codec(v.get('vcodec'))}+{codec(a.get('acodec'))} | {a.get('abr') or 'N/A'} kbps | "
+            f"{v['format_id']}+{a['format_id']}")
@@ -0,0 +1,80 @@
+import os, re, time, threading
+
+# Parallel fragment downloads for segmented (DASH/HLS) formats. yt-dlp reads
+# concurrent_fragment_downloads once per download, so a job's level is tuned between its downloads:
+# starting at START, a probe doubles the level and is kept only if the next segmented download at
+# that level is GAIN times faster than the level before it; otherwise the job settles and probes
+# again after PROBE_AFTER downloads. HTTP 429/403 during fragment retries halves the level at once,
+# and each retry of a fragment waits exponentially longer (retry_sleep).
+# A job setting of 0 is this adaptive mode up to MAX_FRAGMENTS; N > 0 starts at and is capped by N.
+# maximum caps either (scheduler.Scheduler.max_fragments: 1 under a bandwidth limit).
+MAX_FRAGMENTS = int(os.environ.get("MAX_FRAGMENT_DOWNLOADS", 16))
+START = 4
+GAIN = 1.15
+PROBE_AFTER = 4
+RETRIES = 10
+BACKOFF_HOLD = 5  # seconds in which further 429/403 retries count as the same burst
+THROTTLED = re.compile(r'HTTP Error (?:429|403)')
+
+# Seconds before the n-th retry of a fragment (n counts from 0).
+def retry_sleep(n): return min(0.25 * 2 ** n, 8)
+
+class FragmentTuner:
+    def __init__(self, setting=0, maximum=MAX_FRAGMENTS):
+        self.adaptive = not setting
+        wanted = MAX_FRAGMENTS if self.adaptive else setting
+        self.maximum, self.capped = min(wanted, maximum), wanted > maximum
+        self.level = self.settled = min(START, self.maximum) if self.adaptive else self.maximum
+        self.settled_rate = None
+        self.hold = 0
+        self.rate = 0  # bytes/s of the last segmented download
+        self.backoffs = 0
+        self.backed_off = 0
+        self.lock = threading.Lock()
+
+    def record(self, level, nbytes, seconds):
+        if not nbytes or seconds <= 0:
+            return
+        rate = nbytes / seconds
+        with self.lock:
+            self.rate = rate
+            if level == self.level and level > self.settled:
+                if rate >= (self.settled_rate or 0) * GAIN:
+                    self.settled, self.settled_rate = level, rate
+                else:
+                    self.level, self.hold = self.settled, PROBE_AFTER
+            elif level == self.settled:
+                self.settled_rate = rate if self.settled_rate is None else (self.settled_rate + rate) / 2
+                self.hold = max(self.hold - 1, 0)
+            if self.level == self.settled and not self.hold and self.level < self.maximum:
+                self.level = min(self.level * 2, self.maximum)
+
+    def throttle(self):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.backed_off < BACKOFF_HOLD:
+                return
+            self.backed_off, self.backoffs = now, self.backoffs + 1
+            self.level = self.settled = max(min(self.level, self.settled) // 2, 1)
+            self.settled_rate, self.hold = None, PROBE_AFTER
+
+    def describe(self):
+        return (f"🧩 {self.level} parallel fragments{' (auto)' if self.adaptive else ''}"
+                f"{' · capped by the bandwidth limit' if self.capped else ''}"
+                f"{f' · last segmented download {self.rate / 1024 ** 2:.1f} MiB/s' if self.rate else ''}"
+                f"{f' · backed off {self.backoffs}×' if self.backoffs else ''}")
+
+# Passed to yt-dlp as its logger. Fragment retries ("Got error: HTTP Error 429 ... Retrying fragment")
+# arrive as screen messages, which yt-dlp sends to logger.debug; final failures arrive as errors.
+class ThrottleLogger:
+    def __init__(self, tuner):
+        self.tuner = tuner
+
+    def debug(self, msg):
+        if THROTTLED.search(msg):
+            self.tuner.throttle()
+
+    def info(self, msg):
+        pass
+
+    warning = error = debug
@@ -0,0 +1,460 @@
+import os, json, time, uuid, shutil, sqlite3, threading, collections
+from functools import partial
+import downloader, diskspace, fileserver, fragments, mediacache, metrics, scheduler
+
+# Jobs run in background threads owned by the process, not by a Streamlit script run, so a
+# rerun or a closed tab only detaches the UI. State lives in SQLite and the UI re-attaches by ID.
+# Each job works in its own directory under JOBS_DIR that survives a restart: the items table is
+# the journal of finished entries and of their place in the job's ZIP, and yt-dlp's .part files let
+# interrupted downloads continue.
+# With REMOTE_WORKERS, playlist, channel and sync entries are downloaded by worker.py processes instead:
+# the items table is their queue, leased for LEASE seconds at a time and renewed by heartbeats, and an
+# item whose lease lapsed MAX_ATTEMPTS times fails. The job thread only lists, waits and archives.
+DB_PATH = os.environ.get("JOBS_DB", os.path.join("downloads", "jobs.db"))
+JOBS_DIR = os.environ.get("JOBS_DIR", os.path.join("downloads", "jobs"))
+MODES = ('video', 'playlist', 'channel', 'sync')
+MAX_WORKERS = 8  # parallel downloads a job may ask for, from the UI or the API
+REMOTE_WORKERS = os.environ.get("REMOTE_WORKERS", "0") == "1"
+LEASE = float(os.environ.get("WORKER_LEASE", 60))
+MAX_ATTEMPTS = 3
+POLL = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    mode TEXT NOT NULL,
+    url TEXT NOT NULL,
+    title TEXT NOT NULL,
+    format TEXT NOT NULL,
+    workers INTEGER NOT NULL,
+    fragments INTEGER DEFAULT 0,
+    clip TEXT,
+    audio TEXT,
+    remote INTEGER DEFAULT 0,
+    session TEXT,
+    status TEXT NOT NULL,
+    output TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    job_id TEXT NOT NULL REFERENCES jobs(id),
+    idx INTEGER NOT NULL,
+    video_id TEXT NOT NULL,
+    title TEXT,
+    status TEXT NOT NULL,
+    downloaded INTEGER DEFAULT 0,
+    total INTEGER DEFAULT 0,
+    speed REAL,
+    eta REAL,
+    path TEXT,
+    error TEXT,
+    merge_time REAL,
+    download_time REAL,
+    extract_time REAL,
+    estimate INTEGER,
+    full_size INTEGER,
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER DEFAULT 0,
+    zipped TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE TABLE IF NOT EXISTS archive (
+    channel TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    format TEXT NOT NULL,
+    completed REAL NOT NULL,
+    PRIMARY KEY (channel, format, video_id)
+);
+CREATE TABLE IF NOT EXISTS missed (
+    channel TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    format TEXT NOT NULL,
+    failed REAL NOT NULL,
+    PRIMARY KEY (channel, format, video_id)
+);
+CREATE TABLE IF NOT EXISTS workers (
+    name TEXT PRIMARY KEY,
+    threads INTEGER NOT NULL,
+    started REAL NOT NULL,
+    seen REAL NOT NULL
+);
+"""
+# Columns added after a table was first created; applied to existing databases on startup.
+COLUMNS = [('items', 'merge_time', 'REAL'), ('items', 'download_time', 'REAL'), ('jobs', 'session', 'TEXT'),
+           ('items', 'estimate', 'INTEGER'), ('items', 'extract_time', 'REAL'), ('jobs', 'fragments', 'INTEGER DEFAULT 0'),
+           ('jobs', 'clip', 'TEXT'), ('items', 'full_size', 'INTEGER'), ('jobs', 'audio', 'TEXT'),
+           ('jobs', 'remote', 'INTEGER DEFAULT 0'), ('items', 'worker', 'TEXT'), ('items', 'lease_until', 'REAL'),
+           ('items', 'attempts', 'INTEGER DEFAULT 0'), ('items', 'zipped', 'TEXT')]
+
+# publish(path, name=None) takes a finished file out of the job directory and returns where it went;
+# the UI serves it over HTTP, the batch runner moves it to the requested output. remote is the default
+# for new playlist, channel and sync jobs; worker.py opens the database with resume=False.
+class JobManager:
+    def __init__(self, path=DB_PATH, publish=None, remote=REMOTE_WORKERS, resume=True):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.publish = publish or fileserver.publish
+        self.remote = remote
+        self.versions = collections.Counter()  # job id -> number of changes, for cheap change polling
+        self.tuners = {}  # running job id -> fragments.FragmentTuner, for live figures
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        for table, column, decl in COLUMNS:
+            if column not in {r[1] for r in self.db.execute(f"PRAGMA table_info({table})")}:
+                try:
+                    self.db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+                except sqlite3.OperationalError as e:  # added meanwhile by another process on this database
+                    if 'duplicate column' not in str(e):
+                        raise
+        if resume:
+            self.resume()
+
+    # Threads from a previous process are gone; restart its queued and running jobs from their journal.
+    # Working directories of this database's ended jobs are left over from a crash mid-cleanup; other
+    # directories may belong to another process sharing JOBS_DIR (e.g. batch.py) and are kept.
+    def resume(self):
+        for job in self.execute("SELECT id FROM jobs WHERE status NOT IN ('queued', 'running')"):
+            if os.path.isdir(os.path.join(JOBS_DIR, job['id'])):
+                shutil.rmtree(os.path.join(JOBS_DIR, job['id']), ignore_errors=True)
+        for job in self.execute("SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created"):
+            threading.Thread(target=self.run, args=(job['id'],), name=f"job-{job['id']}", daemon=True).start()
+
+    def execute(self, sql, *args):
+        with self.lock:
+            return [dict(r) for r in self.db.execute(sql, args).fetchall()]
+
+    # Playlist, channel and sync jobs are submitted without entries: the job thread streams the
+    # listing itself and inserts items as they are produced. session is the submitting browser
+    # session, the unit the scheduler shares download slots between. fragments is the number of
+    # parallel fragments for segmented formats, 0 to adapt it (see fragments.py). A video job with
+    # clip = {'ranges': [[start, end], ...], 'precise': bool} downloads only those parts. audio is one
+    # of downloader.AUDIO_OUTPUTS for an audio-only job, whose fmt is then normally downloader.AUDIO_FORMAT.
+    # remote (default self.remote) hands a listing's entries to worker.py processes; workers is then unused.
+    def submit(self, mode, url, title, entries=(), fmt='bestvideo+bestaudio', workers=4, session=None, fragments=0,
+               clip=None, audio=None, remote=None):
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        remote = (self.remote if remote is None else remote) and mode != 'video'
+        with self.lock:
+            self.db.execute("BEGIN")
+            self.db.execute("INSERT INTO jobs (id, mode, url, title, format, workers, fragments, clip, audio, remote, "
+                            "session, status, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'queued', ?, ?)",
+                            (job_id, mode, url, title, fmt, workers, fragments, clip and json.dumps(clip), audio,
+                             int(remote), session, now, now))
+            self.db.executemany("INSERT INTO items (job_id, idx, video_id, title, status) VALUES (?, ?, ?, ?, 'queued')",
+                                [(job_id, idx, e['id'], e.get('title')) for idx, e in enumerate(entries, 1)])
+            self.db.execute("COMMIT")
+        threading.Thread(target=self.run, args=(job_id,), name=f"job-{job_id}", daemon=True).start()
+        return job_id
+
+    def job(self, job_id):
+        rows = self.execute("SELECT * FROM jobs WHERE id = ?", job_id)
+        return rows[0] if rows else None
+
+    def items(self, job_id):
+        return self.execute("SELECT * FROM items WHERE job_id = ? ORDER BY idx", job_id)
+
+    def recent(self, limit=100):
+        return self.execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ?", limit)
+
+    # Completed (video id, format) pairs per channel, used by sync to skip what is already mirrored.
+    def archived_ids(self, channel, fmt='bestvideo+bestaudio'):
+        rows = self.execute("SELECT video_id FROM archive WHERE channel = ? AND format = ?", channel, fmt)
+        return {r['video_id'] for r in rows}
+
+    def archive(self, channel, video_id, fmt):
+        self.execute("INSERT OR REPLACE INTO archive (channel, video_id, format, completed) VALUES (?, ?, ?, ?)",
+                     channel, video_id, fmt, time.time())
+        self.execute("DELETE FROM missed WHERE channel = ? AND format = ? AND video_id = ?", channel, fmt, video_id)
+
+    # Uploads of a channel that failed to download; sync lists past the archive until it meets them again.
+    def missed_ids(self, channel, fmt='bestvideo+bestaudio'):
+        rows = self.execute("SELECT video_id FROM missed WHERE channel = ? AND format = ?", channel, fmt)
+        return {r['video_id'] for r in rows}
+
+    def miss(self, channel, video_id, fmt):
+        self.execute("INSERT OR REPLACE INTO missed (channel, video_id, format, failed) VALUES (?, ?, ?, ?)",
+                     channel, video_id, fmt, time.time())
+
+    def forget_missed(self, channel, fmt, video_ids):
+        for video_id in video_ids:
+            self.execute("DELETE FROM missed WHERE channel = ? AND format = ? AND video_id = ?", channel, fmt, video_id)
+
+    def update_job(self, job_id, **fields):
+        fields['updated'] = time.time()
+        self.execute(f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?", *fields.values(), job_id)
+        self.versions[job_id] += 1
+
+    def add_item(self, job_id, idx, entry):
+        self.execute("INSERT OR IGNORE INTO items (job_id, idx, video_id, title, status) VALUES (?, ?, ?, ?, 'queued')",
+                     job_id, idx, entry['id'], entry.get('title'))
+        self.versions[job_id] += 1
+
+    def update_item(self, job_id, idx, **fields):
+        self.execute(f"UPDATE items SET {', '.join(f'{k} = ?' for k in fields)} WHERE job_id = ? AND idx = ?",
+                     *fields.values(), job_id, idx)
+        self.versions[job_id] += 1
+
+    # Like update_item for a worker's leased item; a no-op once the lease has passed to another worker.
+    def update_leased(self, job_id, idx, worker, **fields):
+        self.execute(f"UPDATE items SET {', '.join(f'{k} = ?' for k in fields)} WHERE job_id = ? AND idx = ? AND worker = ?",
+                     *fields.values(), job_id, idx, worker)
+
+    # Writes an item event from downloader.download_entries to its row (through update_leased for a
+    # worker). part_bytes keeps a two-part download's finished bytes between progress events.
+    def item_event(self, job, idx, kind, payload, part_bytes, worker=None):
+        update = partial(self.update_leased, job['id'], idx, worker) if worker else partial(self.update_item, job['id'], idx)
+        if kind == 'progress':
+            # bestvideo+bestaudio reports each format from zero; keep the item's bytes cumulative
+            base = part_bytes.get(idx, 0)
+            downloaded = payload.get('downloaded_bytes') or 0
+            total = payload.get('total_bytes') or payload.get('total_bytes_estimate') or 0
+            if payload['status'] == 'finished':
+                part_bytes[idx] = base + (total or downloaded)
+            update(status='downloading', downloaded=base + downloaded, total=base + total, speed=payload.get('speed'),
+                   eta=payload.get('eta'))
+        elif kind == 'estimate':
+            update(estimate=payload)
+        elif kind == 'full_size':
+            update(full_size=payload)
+        elif kind == 'timing':
+            update(**{f"{payload['stage']}_time": payload['seconds']})
+            metrics.get_metrics().observe(payload['stage'], payload['seconds'], payload.get('bytes'), idx=idx,
+                                          job=job['id'], mode=job['mode'], **({'worker': worker} if worker else {}))
+        elif kind == 'file':
+            update(path=payload)
+        elif kind == 'done':
+            update(status='failed' if payload else 'finished', error=payload)
+
+    # Claims the next item of a running remote job for worker: a queued one, or one whose lease lapsed.
+    # Jobs of the session holding the fewest leases go first (like scheduler slots), then older jobs.
+    def lease(self, worker):
+        now = time.time()
+        claimable = ("(items.status = 'queued' OR (items.status IN ('leased', 'downloading') AND items.lease_until < ?)) "
+                     "AND items.attempts < ?")
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                held = collections.Counter({r[0]: r[1] for r in self.db.execute(
+                    "SELECT COALESCE(jobs.session, jobs.id), COUNT(*) FROM items JOIN jobs ON jobs.id = items.job_id "
+                    "WHERE items.status IN ('leased', 'downloading') AND items.lease_until >= ? GROUP BY 1", (now,))})
+                candidates = self.db.execute(
+                    "SELECT id, COALESCE(session, id) AS owner FROM jobs WHERE remote = 1 AND status = 'running' AND "
+                    f"EXISTS (SELECT 1 FROM items WHERE items.job_id = jobs.id AND {claimable}) ORDER BY created",
+                    (now, MAX_ATTEMPTS)).fetchall()
+                item = None
+                if candidates:
+                    job = min(candidates, key=lambda j: held[j['owner']])
+                    item = self.db.execute(f"SELECT * FROM items WHERE job_id = ? AND {claimable} ORDER BY idx LIMIT 1",
+                                           (job['id'], now, MAX_ATTEMPTS)).fetchone()
+                    self.db.execute("UPDATE items SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                                    "WHERE job_id = ? AND idx = ?", (worker, now + LEASE, item['job_id'], item['idx']))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return dict(item) if item else None
+
+    # Heartbeat of a worker process: extends all of its leases and records it as alive.
+    def renew(self, worker, threads):
+        now = time.time()
+        self.execute("UPDATE items SET lease_until = ? WHERE worker = ? AND status IN ('leased', 'downloading')",
+                     now + LEASE, worker)
+        self.execute("INSERT INTO workers (name, threads, started, seen) VALUES (?, ?, ?, ?) "
+                     "ON CONFLICT (name) DO UPDATE SET threads = excluded.threads, seen = excluded.seen",
+                     worker, threads, now, now)
+
+    # Hands a stopping worker's items back to the queue at once instead of after their leases lapse.
+    # A lease handed back is not a lost one, so it does not count against MAX_ATTEMPTS.
+    def release(self, worker):
+        self.execute("UPDATE items SET status = 'queued', worker = NULL, attempts = MAX(attempts - 1, 0) "
+                     "WHERE worker = ? AND status IN ('leased', 'downloading')", worker)
+        self.execute("DELETE FROM workers WHERE name = ?", worker)
+
+    # Workers whose last heartbeat is within one lease, with the number of items each holds.
+    def workers(self):
+        now = time.time()
+        return self.execute("SELECT workers.*, (SELECT COUNT(*) FROM items WHERE items.worker = workers.name AND "
+                            "items.status IN ('leased', 'downloading') AND items.lease_until >= ?) AS leased "
+                            "FROM workers WHERE seen >= ? ORDER BY name", now, now - LEASE)
+
+    # A remote job's thread streams the listing into the items table, where workers lease them, and then
+    # follows the items until each has finished or failed, passing the 'done' events on. Items of a
+    # resumed job that are not in finished are queued again; leased ones stay with their worker.
+    def dispatch(self, job, listing, on_event, finished=()):
+        self.execute(f"UPDATE items SET status = 'queued', attempts = 0 WHERE job_id = ? AND status IN ('finished', 'failed') "
+                     f"AND idx NOT IN ({', '.join('?' * len(finished))})", job['id'], *finished)
+        try:
+            for idx, entry in enumerate(listing, 1):
+                on_event('entry', idx, entry)
+        except Exception as e:
+            on_event('listing', 0, str(e))
+        results, seen = {}, None
+        while True:
+            self.execute("UPDATE items SET status = 'failed', error = ? WHERE job_id = ? AND status IN ('leased', 'downloading') "
+                         "AND lease_until < ? AND attempts >= ?",
+                         f"Lost by its worker {MAX_ATTEMPTS} times", job['id'], time.time(), MAX_ATTEMPTS)
+            items = self.items(job['id'])
+            state = [(i['status'], i['downloaded']) for i in items]
+            if state != seen:  # workers write from other processes; wake pollers of this job
+                seen = state
+                self.versions[job['id']] += 1
+            for i in items:
+                if i['status'] in ('finished', 'failed') and i['idx'] not in results:
+                    results[i['idx']] = i['error']
+                    on_event('done', i['idx'], i['error'])
+            if len(results) == len(items):
+                return results
+            time.sleep(POLL)
+
+    # A resumed job replays its journal: entries already listed come first in their original order,
+    # those already in the ZIP or with a finished file on disk are not downloaded again, and the rest
+    # of the listing follows. Each finished entry goes into the ZIP as soon as it is done.
+    def run(self, job_id):
+        job = self.job(job_id)
+        archive_key = downloader.url_key(job['url'], flat=True)
+        known = self.items(job_id)
+        workdir = os.path.join(JOBS_DIR, job_id)
+        zip_path = os.path.join(workdir, f"{job_id}.zip")
+        zipped = {i['idx']: json.loads(i['zipped']) for i in known if i['zipped']}
+        zip_size = os.path.getsize(zip_path) if os.path.exists(zip_path) else 0
+        if zipped and zip_size < max(m['end'] for m in zipped.values()):
+            zipped = {}  # the archive is gone; its entries are downloaded again
+            self.execute("UPDATE items SET zipped = NULL WHERE job_id = ?", job_id)
+        journal = [{'id': i['video_id'], 'title': i['title']} for i in known]
+        finished = {i['idx'] for i in known if i['status'] == 'finished' and
+                    (i['idx'] in zipped or i['path'] and os.path.exists(i['path']))}
+        entries = journal if job['mode'] == 'video' else []
+        part_bytes, listing_error, files = {}, [], []
+        clip = json.loads(job['clip']) if job['clip'] else None
+        audio, output_key = job['audio'], downloader.output_key(job['format'], job['audio'])
+        cache = mediacache.get_cache()
+        slots = partial(scheduler.get_scheduler().slot, job['session'] or job_id, job_id)
+        disk = diskspace.get_budget()
+        stats = metrics.get_metrics()
+        tuner = self.tuners[job_id] = fragments.FragmentTuner(job['fragments'] or 0,
+                                                              scheduler.get_scheduler().max_fragments())
+        labels = {'job': job_id, 'mode': job['mode']}
+
+        def on_info(info):
+            job['title'] = downloader.sanitize_filename(info.get('title') or job['title'])
+            self.update_job(job_id, title=job['title'])
+
+        def on_event(kind, idx, payload):
+            if kind == 'entry':
+                if job['mode'] != 'video':
+                    entries.append(payload)
+                    self.add_item(job_id, idx, payload)
+            elif kind == 'listing':
+                listing_error.append(payload)
+            else:
+                if kind == 'file':
+                    files.append(payload)
+                if not job['remote']:  # a worker has written the item already
+                    self.item_event(job, idx, kind, payload, part_bytes)
+                if kind == 'done' and job['mode'] != 'video' and not payload:
+                    store(idx)
+                if kind == 'done' and job['mode'] in ('channel', 'sync'):
+                    if payload:
+                        self.miss(archive_key, entries[idx - 1]['id'], output_key)
+                    else:
+                        self.archive(archive_key, entries[idx - 1]['id'], output_key)
+
+        def store(idx):
+            path = self.execute("SELECT path FROM items WHERE job_id = ? AND idx = ?", job_id, idx)[0]['path']
+            if idx in zipped or not path or not os.path.exists(path):
+                return
+            def journal(member):
+                zipped[idx] = member
+                self.update_item(job_id, idx, zipped=json.dumps(member))
+            start, size = time.monotonic(), os.path.getsize(path)
+            downloader.archive_file(zipf, path, journal)
+            stats.observe('archive', time.monotonic() - start, size, idx=idx, **labels)
+
+        self.update_job(job_id, status='running')
+        os.makedirs(workdir, exist_ok=True)
+        full = None
+        try:
+            if job['mode'] == 'video':
+                opts = downloader.download_opts(workdir, job['format'], f"{job['title']}.%(ext)s", clip, audio)
+                # a clip is not the cached video; yt-dlp cuts and merges it in one ffmpeg run per range
+                err = downloader.download_entries(entries, opts, 1, on_event, None if clip else cache, slots=slots,
+                                                  disk=disk, finished=finished, tuner=tuner, audio=audio,
+                                                  postprocess_workers=0 if clip else downloader.POSTPROCESS_WORKERS)[1]
+                if err:
+                    raise RuntimeError(err)
+                files = files or [self.items(job_id)[0]['path']]
+                if len(files) == 1:
+                    output = self.publish(files[0])
+                else:
+                    zip_path = os.path.join(workdir, f"{job_id}.zip")
+                    with downloader.open_zip(zip_path) as zipf:
+                        for path in files:
+                            downloader.archive_file(zipf, path)
+                    output = self.publish(zip_path, f"{job['title']}.zip")
+            else:
+                # the journal's own uploads are archived as they finish; sync must list past them
+                archived = self.archived_ids(archive_key, output_key) if job['mode'] == 'sync' else set()
+                archived -= {e['id'] for e in journal}
+                missed = self.missed_ids(archive_key, output_key) if job['mode'] in ('channel', 'sync') else set()
+                listing = resumed(journal, downloader.iter_entries(job['url'], archived, on_info, missed))
+                with downloader.open_zip(zip_path, zipped.values()) as zipf:
+                    if job['remote']:
+                        results = self.dispatch(job, listing, on_event, finished)
+                    else:
+                        opts = downloader.download_opts(workdir, job['format'], audio=audio)
+                        results = downloader.download_entries(listing, opts, job['workers'], on_event, cache, slots=slots,
+                                                              disk=disk, finished=finished, tuner=tuner, audio=audio)
+                if listing_error:
+                    raise RuntimeError(listing_error[0])
+                # a job that ran out of disk still publishes what fits, flagged in error
+                full = next((e for e in results.values() if e and e.startswith("Not enough disk space")), None)
+                if not full:  # the listing ran to its end without meeting these: gone from the channel
+                    self.forget_missed(archive_key, output_key, missed - {e['id'] for e in entries})
+                output = self.publish(zip_path, f"{job['title']}.zip") if entries else None
+            self.update_job(job_id, status='finished', output=output, error=full)
+        except Exception as e:
+            self.update_job(job_id, status='failed', error=str(e))
+        shutil.rmtree(workdir, ignore_errors=True)
+        self.tuners.pop(job_id, None)
+        finished = self.job(job_id)
+        stats.observe('job', finished['updated'] - finished['created'], sum(i['total'] or 0 for i in self.items(job_id)),
+                      status=finished['status'], **labels)
+
+# Submits a URL the way the UI does: playlist, channel and sync jobs stream their own listing, a
+# single video is resolved first so its title names the file. Without fmt, an audio job takes the best
+# audio-only format and any other job the best video and audio.
+def submit_url(manager, url, mode='video', fmt=None, workers=4, session=None, fragments=0, clip=None, audio=None):
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}, expected one of {', '.join(MODES)}")
+    if clip and mode != 'video':
+        raise ValueError("A clip can only be cut from a single video")
+    if audio and audio not in downloader.AUDIO_OUTPUTS:
+        raise ValueError(f"Unknown audio output {audio!r}, expected one of {', '.join(downloader.AUDIO_OUTPUTS)}")
+    fmt = fmt or (downloader.AUDIO_FORMAT if audio else 'bestvideo+bestaudio')
+    if mode != 'video':
+        return manager.submit(mode, url, downloader.url_key(url, flat=True), fmt=fmt, workers=workers, session=session,
+                              fragments=fragments, audio=audio)
+    info = downloader.fetch_entry(url)
+    return manager.submit('video', url, downloader.sanitize_filename(info.get('title') or info['id']), [info], fmt,
+                          session=session, fragments=fragments, clip=clip, audio=audio)
+
+def resumed(journal, listing):
+    known = {e['id'] for e in journal}
+    yield from journal
+    yield from (e for e in listing if e['id'] not in known)
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_manager():
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
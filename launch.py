@@ -0,0 +1,20 @@
+import sys
+from streamlit import config
+from streamlit.web import cli
+from streamlit.web.server import server
+import fileserver
+
+# Runs `streamlit ...` with the finished-file route mounted on Streamlit's own Tornado app, so
+# downloads go through the same port as the UI (the only one the platform router forwards).
+# Usage: python launch.py run main.py --server.port $PORT
+create_app = server.Server._create_app
+
+def _create_app(self):
+    app = create_app(self)
+    fileserver.mount(app, config.get_option("server.baseUrlPath"))
+    return app
+
+server.Server._create_app = _create_app
+
+if __name__ == "__main__":
+    sys.exit(cli.main())
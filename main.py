@@ -1,6 +1,10 @@
+import time
+RUN_START = time.perf_counter()  # a cold start's first run includes the imports below
 import streamlit as st
-from yt_dlp import YoutubeDL
-import os, shutil, zipfile, re, tempfile
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import os, threading, collections
+import downloader, diskspace, fileserver, fragments, jobs, mediacache, metrics, scheduler, ydlpool
+import formatselect
 
 st.set_page_config(page_title="YouTube Downloader", layout="centered")
 st.title("📥 YouTube Downloader")
@@ -10,39 +14,261 @@ url = st.text_input("Enter YouTube URL:")
 
 DOWNLOAD_DIR = "downloads"
 ZIP_FILE = os.path.join(DOWNLOAD_DIR, "playlist_downloads.zip")
+MAX_WORKERS = jobs.MAX_WORKERS
+INFO_CACHE_TTL = 30 * 60
+INFO_CACHE_SIZE = 256
+UI_INTERVAL = 0.5  # seconds between progress redraws pushed to the browser
+LISTING_PAGE = 50
+FRAGMENT_CHOICES = [0, 1, 2, 4, 8, 16]  # 0 adapts to throughput, see fragments.py
+WARM_EXTRACTORS = ('Youtube', 'YoutubeTab')
+AUDIO_CHOICES = {None: "🎬 Video with audio", 'copy': "🎧 Audio only, as served (m4a/opus, no re-encode)",
+                 'mp3': "🎧 Audio only, MP3 (encoded while downloading)"}
 
 def fmt_bytes(b): return f"{b/1024/1024:.2f} MiB" if b else "N/A"
 def fmt_eta(s): return f"{s//60}:{int(s%60):02}" if s else "N/A"
-def sanitize_filename(title): return re.sub(r'[^\w\-_\. ]', '_', title)
 
-def hook_factory(c): 
+def hook_factory(c, interval=UI_INTERVAL):
     prog = c.progress(0); txt = c.empty()
+    last = {'at': 0, 'text': None}
     def hook(d):
         if d['status'] == "downloading":
+            now = time.monotonic()
+            if now - last['at'] < interval:
+                return
             dl, tot = d.get('downloaded_bytes', 0), d.get('total_bytes') or d.get('total_bytes_estimate', 0)
             pct = (dl / tot) * 100 if tot else 0
-            prog.progress(pct / 100)
-            txt.markdown(f"⏬ {pct:.1f}% of {fmt_bytes(tot)} at {fmt_bytes(d.get('speed', 0))}/s ETA {fmt_eta(d.get('eta', 0))}")
-        elif d['status'] == "finished":
+            text = f"⏬ {pct:.1f}% of {fmt_bytes(tot)} at {fmt_bytes(d.get('speed', 0))}/s ETA {fmt_eta(d.get('eta', 0))}"
+            if text != last['text']:
+                last.update(at=now, text=text)
+                prog.progress(pct / 100)
+                txt.markdown(text)
+        elif d['status'] == "finished" and last['text'] != "done":
+            last['text'] = "done"
             prog.progress(1.0)
             txt.markdown("✅ Download complete")
     return [hook]
 
-def download_video(video_url, outdir, progress_container=None):
-    try:
-        opts = {
-            'format': 'bestvideo+bestaudio',
-            'merge_output_format': 'mp4',
-            'outtmpl': os.path.join(outdir, "%(title).200s [%(id)s].%(ext)s"),
-            'quiet': True
-        }
-        if progress_container:
-            opts['progress_hooks'] = hook_factory(progress_container)
-        with YoutubeDL(opts) as ydl:
-            ydl.download([video_url])
-        return True, None
-    except Exception as e:
-        return False, str(e)
+# One bar for a whole playlist/channel job: aggregate throughput and an ETA extrapolated from the
+# average size of finished items, instead of a growing column of per-video widgets.
+def playlist_hook_factory(c, interval=UI_INTERVAL):
+    prog = c.progress(0); txt = c.empty(); active = c.empty()
+    errors = c.container()
+    last = {'at': 0}
+    failed = set()
+    def hook(items):
+        for i in items:
+            if i['status'] == 'failed' and i['idx'] not in failed:
+                failed.add(i['idx'])
+                errors.error(f"❌ Failed to download: {i['title']} | Error: {i['error']}")
+        now = time.monotonic()
+        pending = any(i['status'] in ('queued', 'leased', 'downloading') for i in items)
+        if pending and now - last['at'] < interval:
+            return
+        last['at'] = now
+        finished = [i for i in items if i['status'] == 'finished']
+        running = [i for i in items if i['status'] == 'downloading']
+        done = len(finished) + len(failed)
+        partial = sum(i['downloaded'] / i['total'] for i in running if i['total'])
+        prog.progress(min((done + partial) / len(items), 1.0) if items else 1.0)
+        speed = sum(i['speed'] or 0 for i in running)
+        fetched = sum(i['downloaded'] for i in finished + running)
+        avg = sum(i['downloaded'] for i in finished) / len(finished) if finished else 0
+        remaining = max(avg * (len(items) - done) - sum(i['downloaded'] for i in running), 0)
+        eta = int(remaining / speed) if speed and avg else 0
+        txt.markdown(f"⏬ {done}/{len(items)} done · {fmt_bytes(fetched)} at {fmt_bytes(speed)}/s ETA {fmt_eta(eta)}")
+        active.caption("  \n".join(f"⏬ {i['title']}{f' · 🛰 {w}' if (w := i['worker']) else ''}" for i in running))
+    return hook
+
+@st.cache_resource
+def info_cache_stats():
+    return {'lookups': 0, 'misses': 0, 'lock': threading.Lock()}
+
+# Shared by every session in the process; entries expire after INFO_CACHE_TTL and the
+# least recently used ones are evicted once INFO_CACHE_SIZE is reached.
+@st.cache_data(ttl=INFO_CACHE_TTL, max_entries=INFO_CACHE_SIZE, show_spinner=False)
+def cached_info(key, _url):
+    stats = info_cache_stats()
+    with stats['lock']:
+        stats['misses'] += 1
+    with ydlpool.get_pool().lease() as ydl:
+        return ydl.extract_info(_url, download=False)
+
+def fetch_info(url):
+    stats = info_cache_stats()
+    with stats['lock']:
+        stats['lookups'] += 1
+    return cached_info(downloader.url_key(url), url)
+
+# Format pairing per video ID, so reruns (picking a quality, a clip or an output) skip it.
+@st.cache_data(ttl=INFO_CACHE_TTL, max_entries=INFO_CACHE_SIZE, show_spinner=False)
+def format_choices(video_id, _formats):
+    return formatselect.ranked_pairs(_formats), formatselect.best_audio(_formats)
+
+# Imports yt-dlp and leaves a pooled YoutubeDL with the YouTube extractors loaded, once per process and
+# off the script thread: the first page renders without yt-dlp and the first lookup finds it ready.
+@st.cache_resource
+def warm_up():
+    def load():
+        with ydlpool.get_pool().lease() as ydl:
+            for key in WARM_EXTRACTORS:
+                ydl.get_info_extractor(key)
+    threading.Thread(target=load, name="warm-up", daemon=True).start()
+
+# Script run times in the process. The first run after a start is cold and pays for the imports and
+# resources; a session's first page is "first" and every interaction after it a "rerun".
+@st.cache_resource
+def render_stats():
+    return {'cold': None, 'reruns': collections.deque(maxlen=200), 'lock': threading.Lock()}
+
+# Rebuilds a yt-dlp style progress dict from a job item row so hook_factory can render it.
+def item_progress(item):
+    if item['status'] == 'finished':
+        return {'status': 'finished'}
+    return {'status': 'downloading', 'downloaded_bytes': item['downloaded'], 'total_bytes': item['total'],
+            'speed': item['speed'], 'eta': item['eta']}
+
+JOB_DONE = {
+    'video': ("Download finished ✅", "📥 Download Video"),
+    'playlist': ("✅ Playlist downloaded and zipped successfully!", "📦 Download ZIP"),
+    'channel': ("✅ Channel videos downloaded and zipped successfully!", "📦 Download Channel ZIP"),
+    'sync': ("✅ New uploads downloaded and zipped successfully!", "📦 Download New Uploads ZIP"),
+}
+
+def start_job(job_mode, job_url, title, entries=(), fmt=None, workers=4, clip=None):
+    ctx = get_script_run_ctx()
+    audio = st.session_state.get('audio')
+    fmt = fmt or (downloader.AUDIO_FORMAT if audio else 'bestvideo+bestaudio')
+    job_id = manager.submit(job_mode, job_url, title, entries, fmt, workers, ctx and ctx.session_id,
+                            st.session_state.get('fragments', 0), clip, audio)
+    st.session_state.jobs.append(job_id)
+    st.query_params['job'] = job_id
+
+# Clip settings for a single video: chapters from info['chapters'] or a start/end time. Returns the
+# clip for manager.submit (None for the whole video, False while the times are invalid) and the
+# fraction of the video it covers.
+def clip_picker(info):
+    from yt_dlp.utils import parse_duration  # yt-dlp is imported lazily, see warm_up
+    duration = info.get('duration') or 0
+    chapters = info.get('chapters') or []
+    with st.expander("✂️ Clip: download only part of the video"):
+        picked = st.multiselect("Chapters", range(len(chapters)),
+                                format_func=lambda i: f"{fmt_eta(int(chapters[i]['start_time']))} {chapters[i]['title']}")
+        col1, col2 = st.columns(2)
+        start = col1.text_input("Start (e.g. 1:30)", disabled=bool(picked))
+        end = col2.text_input("End (e.g. 2:15)", disabled=bool(picked))
+        precise = st.checkbox("Cut exactly at these times (re-encodes around the cuts; otherwise cuts start at the "
+                              "nearest keyframe before)")
+    if picked:
+        ranges = downloader.merge_ranges([chapters[i]['start_time'], chapters[i]['end_time']] for i in picked)
+    elif start or end:
+        bounds = [parse_duration(start) if start else 0, parse_duration(end) if end else duration]
+        if None in bounds or not 0 <= bounds[0] < bounds[1] or (duration and bounds[1] > duration):
+            st.error(f"✂️ Enter times like 1:30 with start before end{f', within {fmt_eta(duration)}' if duration else ''}.")
+            return False, 1
+        ranges = [bounds]
+    else:
+        return None, 1
+    covered = sum(e - s for s, e in ranges)
+    st.caption(f"✂️ {len(ranges)} part{'s' if len(ranges) > 1 else ''}, {fmt_eta(int(covered))} in total")
+    return {'ranges': ranges, 'precise': precise}, covered / duration if duration else 1
+
+# Renders the listing of a playlist/channel job one page at a time, redrawing only when the
+# streamed listing has grown.
+def listing_factory(c, job_id):
+    page = c.number_input("📄 Page", min_value=1, value=1, step=1, key=f"page-{job_id}")
+    body = c.empty()
+    shown = {'count': None}
+    def render(items, listing_done):
+        if shown['count'] == (len(items), listing_done):
+            return
+        shown['count'] = (len(items), listing_done)
+        with body.container():
+            st.markdown(f"### 📄 Videos: {len(items)} listed{'' if listing_done else ' so far'}")
+            for item in items[(page - 1) * LISTING_PAGE:page * LISTING_PAGE]:
+                st.write(f"{item['idx']}. {item['title']}")
+    return render
+
+def job_view(job_id):
+    box = st.container(border=True)
+    header = box.empty()
+    status = box.empty()
+    hook = listing = None
+    def update():
+        nonlocal hook, listing
+        job, items = manager.job(job_id), manager.items(job_id)
+        header.markdown(f"**{job['title']}** · job `{job_id}`")
+        if job['mode'] != 'video':
+            hook = hook or playlist_hook_factory(box)
+            hook(items)
+            listing = listing or listing_factory(box.expander("📄 Videos"), job_id)
+            listing(items, job['status'] not in ('queued', 'running'))
+        elif items[0]['status'] not in ('queued', 'failed'):
+            hook = hook or hook_factory(box)[0]
+            hook(item_progress(items[0]))
+        done = sum(i['status'] in ('finished', 'failed') for i in items)
+        waiting = slots.position(job_id) if job['status'] == 'running' else None
+        if waiting:
+            position, eta = waiting
+            status.info(f"🕒 Waiting for a download slot · position {position} in queue"
+                        f"{f' · starts in ~{fmt_eta(int(eta))}' if eta >= 1 else ''} · {done}/{len(items)} done")
+            return False
+        if job['status'] in ('queued', 'running'):
+            tuner = manager.tuners.get(job_id)
+            details = f"  \n{tuner.describe()}" if tuner and tuner.rate else ""
+            if job['remote'] and not manager.workers():
+                details += "  \n🛰 No download worker is running; start one with `python worker.py`."
+            status.info(f"⏳ {job['status'].capitalize()} · {done}/{len(items)} done{details}")
+            return False
+        with status.container():
+            if job['status'] == 'finished':
+                message, label = JOB_DONE[job['mode']]
+                label = "🎧 Download Audio" if job['audio'] and job['mode'] == 'video' else label
+                if job['error']:
+                    st.warning(f"⚠️ Stopped early. {job['error']}. The ZIP holds everything downloaded before that.")
+                    st.link_button(label, job['output'])
+                elif job['output']:
+                    st.success(message)
+                    st.link_button(label, job['output'])
+                else:
+                    st.success("✅ Nothing new to download, already up to date.")
+                st.caption(stage_summary(job, items))
+            else:
+                st.error(f"Error: {job['error']}")
+        return True
+    return update
+
+# Per-stage time summed over items next to the job's wall time; downloads and merges run in
+# separate pools, so the sum exceeding the wall time is the overlap gained.
+def stage_summary(job, items):
+    download = sum(i['download_time'] or 0 for i in items)
+    merge = sum(i['merge_time'] or 0 for i in items)
+    merges = sum(i['merge_time'] is not None for i in items)
+    wall = job['updated'] - job['created']
+    estimate, actual = sum(i['estimate'] or 0 for i in items), sum(i['total'] or 0 for i in items)
+    full = sum(i['full_size'] or 0 for i in items)
+    return (f"⏱ download {download:.1f}s · {merges} stream-copy merges {merge:.1f}s · wall {wall:.1f}s"
+            f" · overlap {max(download + merge - wall, 0):.1f}s"
+            f"{f' · 💽 estimated {fmt_bytes(estimate)}, actual {fmt_bytes(actual)}' if estimate else ''}"
+            f"{f' · ✂️ clip fetched {fmt_bytes(actual)} of ~{fmt_bytes(full)} for the whole video ({1 - actual / full:.0%} saved)' if full else ''}")
+
+def watch_jobs(job_ids):
+    updates = [job_view(job_id) for job_id in job_ids if manager.job(job_id)]
+    while not all([update() for update in updates]):
+        time.sleep(UI_INTERVAL)
+
+manager = jobs.get_manager()
+slots = scheduler.get_scheduler()
+disk = diskspace.get_budget()
+fileserver.start()  # also serves /metrics
+if 'jobs' not in st.session_state:
+    st.session_state.jobs = []
+if st.query_params.get('job') and st.query_params['job'] not in st.session_state.jobs:
+    st.session_state.jobs.append(st.query_params['job'])
+
+if url:
+    st.selectbox("🧩 Parallel fragments (DASH/HLS formats)", FRAGMENT_CHOICES, key='fragments',
+                 format_func=lambda n: f"Auto (up to {fragments.MAX_FRAGMENTS})" if n == 0 else str(n))
+    st.selectbox("🎧 Output", list(AUDIO_CHOICES), key='audio', format_func=AUDIO_CHOICES.get)
 
 # --- Single Video Mode ---
 if mode == "🎬 Single Video" and url:
@@ -50,9 +276,8 @@ if mode == "🎬 Single Video" and url:
 
     with st.spinner("Fetching video info..."):
         try:
-            with YoutubeDL({'quiet': True}) as ydl:
-                info = ydl.extract_info(url, download=False)
-                formats = info.get('formats', [])
+            info = fetch_info(url)
+            formats = info.get('formats', [])
         except Exception as e:
             st.error(f"Error fetching info: {e}")
             formats = []
@@ -61,165 +286,114 @@ if mode == "🎬 Single Video" and url:
         st.markdown(f"**Video Title:** `{info.get('title')}`")
         st.video(info.get('url'))
 
-        video_formats = [f for f in formats if f.get('vcodec') != 'none' and f.get('acodec') == 'none']
-        audio_formats = [f for f in formats if f.get('vcodec') == 'none' and f.get('acodec') != 'none']
-
-        compatible_pairs = []
-        for v in video_formats:
-            for a in audio_formats:
-                if v['ext'] == a['ext']:
-                    compatible_pairs.append({'video': v, 'audio': a})
-
-        compatible_pairs.sort(key=lambda x: (
-            x['video'].get('height') or 0,
-            x['audio'].get('abr') or 0
-        ), reverse=True)
-
-        if not compatible_pairs:
+        compatible_pairs, best_audio = format_choices(info['id'], formats)
+
+        if st.session_state.get('audio'):
+            if not best_audio:
+                st.error("No audio-only format found.")
+            else:
+                clip, fraction = clip_picker(info)
+                free = disk.free(jobs.JOBS_DIR, mediacache.CACHE_DIR)
+                size = int(formatselect.estimate_size([best_audio], info.get('duration')) * fraction)
+                st.caption(f"🎧 {formatselect.audio_label(best_audio)} · 💽 ~{fmt_bytes(size)} · "
+                           f"{fmt_bytes(max(free, 0))} free for downloads")
+                if st.button("🎧 Download Audio", disabled=size > free or clip is False):
+                    start_job('video', url, downloader.sanitize_filename(info.get('title', 'video')), [info], clip=clip)
+        elif not compatible_pairs:
             st.error("No compatible video/audio format pairs found.")
         else:
-            video_display_list = [
-                f"{pair['video'].get('height', 'N/A')}p | {pair['video']['ext']} | {pair['video']['format_id']}"
-                for pair in compatible_pairs
-            ]
-            audio_display_list = [
-                f"{pair['audio'].get('abr', 'N/A')} kbps | {pair['audio']['ext']} | {pair['audio']['format_id']}"
-                for pair in compatible_pairs
-            ]
-
-            selected_idx = 0
-            selected_video_display = st.selectbox("🎥 Select Video Quality:", video_display_list, index=selected_idx)
-            selected_audio_display = st.selectbox("🎧 Select Audio Quality:", audio_display_list, index=selected_idx)
-
+            selected_idx = st.selectbox("🎥 Select Quality:", range(len(compatible_pairs)),
+                                        format_func=lambda i: formatselect.pair_label(compatible_pairs[i]))
             selected_pair = compatible_pairs[selected_idx]
             selected_video_id = selected_pair['video']['format_id']
             selected_audio_id = selected_pair['audio']['format_id']
 
+            clip, fraction = clip_picker(info)
+
+            # Pre-flight: refuse before any bytes are fetched if the temp or cache volume cannot hold it
+            free = disk.free(jobs.JOBS_DIR, mediacache.CACHE_DIR)
+            sizes = [int(formatselect.estimate_size([p['video'], p['audio']], info.get('duration')) * fraction)
+                     for p in (selected_pair, compatible_pairs[0])]
+            st.caption(f"💽 ~{fmt_bytes(sizes[0])} · {fmt_bytes(max(free, 0))} free for downloads")
+            if sizes[0] > free:
+                st.error("Not enough disk space for this quality right now; pick a smaller one or try again later.")
+
             col1, col2 = st.columns(2)
 
             with col1:
-                if st.button("⬇️ Download Video with Audio"):
-                    safe_title = sanitize_filename(info.get('title', 'video'))
-                    filename = f"{safe_title}.mp4"
-                    ydl_opts = {
-                        'format': f"{selected_video_id}+{selected_audio_id}",
-                        'merge_output_format': 'mp4',
-                        'outtmpl': filename,
-                        'quiet': True,
-                        'progress_hooks': hook_factory(st.container())
-                    }
-                    with YoutubeDL(ydl_opts) as ydl:
-                        try:
-                            ydl.download([url])
-                            with open(filename, "rb") as f:
-                                st.success("Download finished ✅")
-                                st.download_button("📥 Download Merged Video", f, file_name=filename, mime="video/mp4")
-                        except Exception as e:
-                            st.error(f"Error: {e}")
+                if st.button("⬇️ Download Video with Audio", disabled=sizes[0] > free or clip is False):
+                    safe_title = downloader.sanitize_filename(info.get('title', 'video'))
+                    start_job('video', url, safe_title, [info], f"{selected_video_id}+{selected_audio_id}", clip=clip)
 
             with col2:
-                if st.button("⭐ Download Best Quality"):
-                    safe_title = sanitize_filename(info.get('title', 'video'))
-                    filename = f"{safe_title}_best.mp4"
-                    ydl_opts = {
-                        'format': 'bestvideo+bestaudio',
-                        'merge_output_format': 'mp4',
-                        'outtmpl': filename,
-                        'quiet': True,
-                        'progress_hooks': hook_factory(st.container())
-                    }
-                    with YoutubeDL(ydl_opts) as ydl:
-                        try:
-                            ydl.download([url])
-                            with open(filename, "rb") as f:
-                                st.success("Best quality video downloaded ✅")
-                                st.download_button("📥 Download Best Video", f, file_name=filename, mime="video/mp4")
-                        except Exception as e:
-                            st.error(f"Error: {e}")
+                if st.button("⭐ Download Best Quality", disabled=sizes[1] > free or clip is False):
+                    safe_title = downloader.sanitize_filename(info.get('title', 'video'))
+                    start_job('video', url, f"{safe_title}_best", [info], clip=clip)
 
 # --- Playlist Mode ---
+# The listing is streamed by the job itself, so downloads start with the first page.
 if mode == "📃 Playlist" and url:
+    workers = st.slider("⚙️ Parallel downloads", 1, MAX_WORKERS, 4)
     if st.button("📦 Download Playlist as ZIP"):
-        with st.spinner("Fetching playlist info..."):
-            try:
-                with YoutubeDL({'quiet': True, 'extract_flat': True}) as ydl:
-                    playlist_info = ydl.extract_info(url, download=False)
-                    entries = playlist_info.get('entries', [])
-                    playlist_title = sanitize_filename(playlist_info.get('title', 'playlist'))
-            except Exception as e:
-                st.error(f"Error: {e}")
-                st.stop()
-
-        st.subheader(f"📃 Playlist: {playlist_title}")
-        st.markdown("### 📄 Videos to be downloaded:")
-        for idx, video in enumerate(entries, 1):
-            st.write(f"{idx}. {video.get('title')}")
-
-        with tempfile.TemporaryDirectory() as temp_dir:
-            downloaded_files = []
-
-            for idx, video in enumerate(entries, 1):
-                st.markdown(f"---\n### ⏬ Downloading {idx}/{len(entries)}: **{video.get('title')}**")
-                video_url = f"https://www.youtube.com/watch?v={video['id']}"
-                progress_area = st.container()
-
-                success, err = download_video(video_url, temp_dir, progress_area)
-                if success:
-                    downloaded_files.append(video['title'])
-                else:
-                    st.error(f"❌ Failed to download: {video['title']} | Error: {err}")
-
-            zip_path = os.path.join(temp_dir, f"{playlist_title}.zip")
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                for file in os.listdir(temp_dir):
-                    if file.endswith(".mp4"):
-                        zipf.write(os.path.join(temp_dir, file), arcname=file)
-
-            with open(zip_path, "rb") as zf:
-                st.success("✅ Playlist downloaded and zipped successfully!")
-                st.download_button("📦 Download ZIP", zf, file_name=f"{playlist_title}.zip")
+        start_job('playlist', url, downloader.url_key(url, flat=True), workers=workers)
 
 # --- Channel Mode ---
 if mode == "📡 Channel" and url:
-    if st.button("📥 Download Full Channel"):
-        with st.spinner("Getting videos from channel..."):
-            try:
-                with YoutubeDL({'quiet': True, 'extract_flat': True}) as ydl:
-                    channel_info = ydl.extract_info(url, download=False)
-                    entries = channel_info.get('entries', [])
-                    channel_title = sanitize_filename(channel_info.get('title', 'channel'))
-            except Exception as e:
-                st.error(f"Error: {e}")
-                st.stop()
-
-        st.subheader(f"📡 Channel: {channel_title}")
-        st.markdown("### 🎞 Videos to be downloaded:")
-        for idx, video in enumerate(entries, 1):
-            st.write(f"{idx}. {video.get('title')}")
-
-        with tempfile.TemporaryDirectory() as temp_dir:
-            downloaded_files = []
-
-            for idx, video in enumerate(entries, 1):
-                st.markdown(f"---\n### ⏬ Downloading {idx}/{len(entries)}: **{video.get('title')}**")
-                video_url = f"https://www.youtube.com/watch?v={video['id']}"
-                progress_area = st.container()
-
-                success, err = download_video(video_url, temp_dir, progress_area)
-                if success:
-                    downloaded_files.append(video['title'])
-                else:
-                    st.error(f"❌ Failed to download: {video['title']} | Error: {err}")
-
-            zip_path = os.path.join(temp_dir, f"{channel_title}.zip")
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                for file in os.listdir(temp_dir):
-                    if file.endswith(".mp4"):
-                        zipf.write(os.path.join(temp_dir, file), arcname=file)
-
-            with open(zip_path, "rb") as zf:
-                st.success("✅ Channel videos downloaded and zipped successfully!")
-                st.download_button("📦 Download Channel ZIP", zf, file_name=f"{channel_title}.zip")
+    workers = st.slider("⚙️ Parallel downloads", 1, MAX_WORKERS, 4)
+    col1, col2 = st.columns(2)
+    if col1.button("📥 Download Full Channel"):
+        start_job('channel', url, downloader.url_key(url, flat=True), workers=workers)
+    if col2.button("🔄 Sync New Uploads"):
+        start_job('sync', url, downloader.url_key(url, flat=True), workers=workers)
+
+stats = info_cache_stats()
+st.sidebar.caption(f"🗂 Info cache: {stats['lookups'] - stats['misses']} hits / {stats['misses']} misses")
+media = mediacache.get_cache()
+lookups = media.stats['hits'] + media.stats['misses']
+count, used = media.usage()
+st.sidebar.caption(f"💾 Media cache: {media.stats['hits']}/{lookups} hits ({media.stats['hits'] / lookups if lookups else 0:.0%}) · "
+                   f"{fmt_bytes(media.stats['hit_bytes'])} served · {count} files, {fmt_bytes(used)} of {fmt_bytes(media.budget)}")
+running, waiting = slots.usage()
+st.sidebar.caption(f"🚦 Downloads: {running}/{slots.slots} slots in use · {waiting} waiting"
+                   f"{f' · {fmt_bytes(slots.bandwidth)}/s shared' if slots.bandwidth else ''}")
+reservations, outstanding = disk.usage()
+st.sidebar.caption(f"💽 Disk: {reservations} downloads holding {fmt_bytes(outstanding)} reserved · "
+                   f"{fmt_bytes(max(disk.free(jobs.JOBS_DIR, mediacache.CACHE_DIR), 0))} free after headroom · "
+                   f"{disk.stats['rejected']} refused")
+if manager.remote:
+    alive = manager.workers()
+    st.sidebar.caption(f"🛰 Workers: {len(alive)} alive · {sum(w['threads'] for w in alive)} threads · "
+                       f"{sum(w['leased'] for w in alive)} items leased")
+published, published_bytes = fileserver.usage()
+st.sidebar.caption(f"📤 Ready for download: {published} files, {fmt_bytes(published_bytes)} of "
+                   f"{fmt_bytes(fileserver.RETENTION_BYTES)} · kept {fileserver.RETENTION // 60} min after last request")
+render_line = st.sidebar.empty()
+with st.sidebar.expander("📈 Phase metrics"):
+    for phase, m in metrics.get_metrics().summary().items():
+        rate = f" · {fmt_bytes(m['rate'])}/s" if m['bytes'] else ""
+        st.caption(f"**{phase}** · {m['count']}× · p50 {m['p50']:.2f}s · p95 {m['p95']:.2f}s{rate}")
+    st.caption(f"Prometheus: {fileserver.LOCAL_URL}/metrics · events: `{metrics.LOG_PATH}`")
+
+# Timed up to the job views, which keep redrawing until their jobs end; also a 'render' metrics phase.
+run_time = time.perf_counter() - RUN_START
+timing = render_stats()
+with timing['lock']:
+    run = 'cold' if timing['cold'] is None else 'rerun' if st.session_state.get('rendered') else 'first'
+    if run == 'cold':
+        timing['cold'] = run_time
+    elif run == 'rerun':
+        timing['reruns'].append(run_time)
+    reruns = list(timing['reruns'])
+st.session_state.rendered = True
+metrics.get_metrics().observe('render', run_time, run=run)
+render_line.caption(f"⏱ Page: this run {run_time * 1000:.0f} ms ({run}) · cold start {timing['cold'] * 1000:.0f} ms"
+                    f"{f' · reruns p50 {metrics.quantile(reruns, 0.5) * 1000:.0f} ms, p95 {metrics.quantile(reruns, 0.95) * 1000:.0f} ms' if reruns else ''}")
+warm_up()
+
+if st.session_state.jobs:
+    st.subheader("🗂 Jobs")
+    st.caption("Jobs keep running if you switch modes or close the tab, and resume after a server restart; reopen this page with `?job=<id>` to re-attach.")
+    watch_jobs(reversed(st.session_state.jobs))
 
 
 
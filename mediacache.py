@@ -0,0 +1,101 @@
+import os, time, shutil, hashlib, sqlite3, threading
+
+# Finished downloads are kept in a shared on-disk cache keyed by (video id, format string), so a
+# video that appears in several jobs or playlists is fetched once. Outputs are hard links into
+# the cache when the filesystem allows it, copies otherwise. The least recently used files are
+# evicted once the cache grows past its byte budget.
+CACHE_DIR = os.environ.get("MEDIA_CACHE_DIR", os.path.join("downloads", "cache"))
+CACHE_BYTES = int(os.environ.get("MEDIA_CACHE_BYTES", 10 * 1024 ** 3))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    key TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    format TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS media_last_used ON media (last_used);
+"""
+
+def link_or_copy(src, dest):
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+class MediaCache:
+    def __init__(self, path=CACHE_DIR, budget=CACHE_BYTES):
+        os.makedirs(path, exist_ok=True)
+        self.path, self.budget = path, budget
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(path, "index.db"), check_same_thread=False, isolation_level=None)
+        self.db.executescript(SCHEMA)
+        self.stats = {'hits': 0, 'misses': 0, 'hit_bytes': 0}
+
+    def key(self, video_id, fmt):
+        return hashlib.sha1(f"{video_id}\n{fmt}".encode()).hexdigest()
+
+    def file(self, key, ext):
+        return os.path.join(self.path, f"{key}.{ext}")
+
+    def usage(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM media").fetchone()
+
+    # Links the cached file to dest (ext is filled in by the caller's template) and returns the
+    # final path, or None on a miss.
+    def fetch(self, video_id, fmt, dest_for_ext):
+        key = self.key(video_id, fmt)
+        with self.lock:
+            row = self.db.execute("SELECT ext, size FROM media WHERE key = ?", (key,)).fetchone()
+            if row:
+                try:
+                    dest = dest_for_ext(row[0])
+                    link_or_copy(self.file(key, row[0]), dest)
+                except OSError:
+                    self.db.execute("DELETE FROM media WHERE key = ?", (key,))
+                    row = None
+            if not row:
+                self.stats['misses'] += 1
+                return None
+            self.db.execute("UPDATE media SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.stats['hits'] += 1
+            self.stats['hit_bytes'] += row[1]
+            return dest
+
+    def store(self, video_id, fmt, path):
+        key, ext = self.key(video_id, fmt), os.path.splitext(path)[1].lstrip('.')
+        size = os.path.getsize(path)
+        if size > self.budget:
+            return
+        tmp = self.file(key, f"{ext}.tmp{threading.get_ident()}")
+        link_or_copy(path, tmp)
+        with self.lock:
+            os.replace(tmp, self.file(key, ext))
+            self.db.execute("INSERT OR REPLACE INTO media (key, video_id, format, ext, size, last_used) "
+                            "VALUES (?, ?, ?, ?, ?, ?)", (key, video_id, fmt, ext, size, time.time()))
+            self._evict()
+
+    def _evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM media").fetchone()[0]
+        for key, ext, size in self.db.execute("SELECT key, ext, size FROM media ORDER BY last_used").fetchall():
+            if total <= self.budget:
+                break
+            self.db.execute("DELETE FROM media WHERE key = ?", (key,))
+            try:
+                os.remove(self.file(key, ext))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MediaCache()
+        return _cache
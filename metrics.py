@@ -0,0 +1,75 @@
+import os, json, time, threading, collections
+import diskspace, scheduler, ydlpool
+
+# Per-phase timings and byte counts (extract, download, merge, archive, serve, job). Every
+# observation is appended to a JSONL event log; quantiles are computed over the last WINDOW
+# observations of each phase and exposed in Prometheus text format by the file server.
+LOG_PATH = os.environ.get("METRICS_LOG", os.path.join("downloads", "metrics.jsonl"))
+WINDOW = int(os.environ.get("METRICS_WINDOW", 1000))
+QUANTILES = (0.5, 0.95)
+
+def quantile(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] if values else 0
+
+class Metrics:
+    def __init__(self, log_path=LOG_PATH, window=WINDOW):
+        self.lock = threading.Lock()
+        self.recent = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self.totals = collections.defaultdict(lambda: {'count': 0, 'seconds': 0.0, 'bytes': 0})
+        self.log = None
+        if log_path:
+            os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+            self.log = open(log_path, 'a', buffering=1, encoding='utf-8')
+
+    def observe(self, phase, seconds, nbytes=0, **fields):
+        with self.lock:
+            self.recent[phase].append(seconds)
+            total = self.totals[phase]
+            total['count'] += 1
+            total['seconds'] += seconds
+            total['bytes'] += nbytes or 0
+            if self.log:
+                self.log.write(json.dumps({'ts': round(time.time(), 3), 'phase': phase, 'seconds': round(seconds, 4),
+                                           'bytes': nbytes or 0, **fields}) + "\n")
+
+    # {phase: {count, p50, p95, bytes, rate}}; rate is bytes per second of time spent in the phase.
+    def summary(self):
+        with self.lock:
+            return {phase: {**total, **{f"p{int(q * 100)}": quantile(self.recent[phase], q) for q in QUANTILES},
+                            'rate': total['bytes'] / total['seconds'] if total['seconds'] else 0}
+                    for phase, total in self.totals.items()}
+
+    def render(self):
+        lines = ["# HELP ytdl_phase_seconds Seconds spent per phase.", "# TYPE ytdl_phase_seconds summary"]
+        summary = self.summary()
+        for phase, s in summary.items():
+            for q in QUANTILES:
+                lines.append(f'ytdl_phase_seconds{{phase="{phase}",quantile="{q}"}} {s[f"p{int(q * 100)}"]:.4f}')
+            lines.append(f'ytdl_phase_seconds_sum{{phase="{phase}"}} {s["seconds"]:.4f}')
+            lines.append(f'ytdl_phase_seconds_count{{phase="{phase}"}} {s["count"]}')
+        lines += ["# HELP ytdl_phase_bytes_total Bytes handled per phase.", "# TYPE ytdl_phase_bytes_total counter"]
+        lines += [f'ytdl_phase_bytes_total{{phase="{phase}"}} {s["bytes"]}' for phase, s in summary.items()]
+        active, waiting = scheduler.get_scheduler().usage()
+        outstanding = diskspace.get_budget().usage()[1]
+        lines += ["# HELP ytdl_download_slots Download slots in use and downloads waiting for one.",
+                  "# TYPE ytdl_download_slots gauge",
+                  f'ytdl_download_slots{{state="active"}} {active}',
+                  f'ytdl_download_slots{{state="waiting"}} {waiting}',
+                  "# HELP ytdl_disk_reserved_bytes Bytes reserved by running downloads but not written yet.",
+                  "# TYPE ytdl_disk_reserved_bytes gauge",
+                  f"ytdl_disk_reserved_bytes {outstanding}",
+                  "# HELP ytdl_ydl_leases_total YoutubeDL leases served by a new or a pooled instance.",
+                  "# TYPE ytdl_ydl_leases_total counter"]
+        lines += [f'ytdl_ydl_leases_total{{instance="{k}"}} {v}' for k, v in ydlpool.get_pool().stats.items()]
+        return "\n".join(lines) + "\n"
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def get_metrics():
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
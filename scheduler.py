@@ -0,0 +1,89 @@
+import os, time, itertools, threading, collections
+from contextlib import contextmanager
+import fragments
+
+# Process-wide admission control for downloads from every session. At most MAX_DOWNLOADS run at
+# once; a free slot goes to the waiting session that currently holds the fewest slots (arrival
+# order breaks ties), so one channel job cannot starve everyone else. BANDWIDTH_LIMIT (bytes/s,
+# 0 = unlimited) is split evenly between the running downloads through yt-dlp's ratelimit. A plain
+# HTTP download follows its share as it changes; a segmented (DASH/HLS) one keeps the share it
+# started with and, under a limit, fetches one fragment at a time (see max_fragments).
+MAX_DOWNLOADS = int(os.environ.get("MAX_DOWNLOADS", 6))
+BANDWIDTH_LIMIT = int(os.environ.get("BANDWIDTH_LIMIT", 0))
+
+Ticket = collections.namedtuple('Ticket', 'seq session job_id')
+
+class Scheduler:
+    def __init__(self, slots=MAX_DOWNLOADS, bandwidth=BANDWIDTH_LIMIT):
+        self.slots, self.bandwidth = slots, bandwidth
+        self.cond = threading.Condition()
+        self.seq = itertools.count()
+        self.waiting = []
+        self.active = {}  # ticket -> YoutubeDL whose ratelimit is managed, or None
+        self.durations = collections.deque(maxlen=50)
+
+    def _ranked(self):
+        load = collections.Counter(t.session for t in self.active)
+        return sorted(self.waiting, key=lambda t: (load[t.session], t.seq))
+
+    def _rebalance(self):
+        if not self.bandwidth:
+            return
+        share = max(self.bandwidth // max(len(self.active), 1), 1)
+        for ydl in self.active.values():
+            if ydl:
+                # read by yt-dlp's HTTP downloader on every chunk; a segmented download copies it once
+                ydl.params['ratelimit'] = share
+
+    # Parallel fragments a segmented download may use. yt-dlp hands its fragment downloads a copy
+    # of the params, so each parallel fragment would be throttled to the whole share on its own.
+    def max_fragments(self):
+        return 1 if self.bandwidth else fragments.MAX_FRAGMENTS
+
+    @contextmanager
+    def slot(self, session, job_id, ydl=None):
+        ticket = Ticket(next(self.seq), session, job_id)
+        with self.cond:
+            self.waiting.append(ticket)
+            while len(self.active) >= self.slots or self._ranked()[0] is not ticket:
+                self.cond.wait()
+            self.waiting.remove(ticket)
+            self.active[ticket] = ydl
+            self._rebalance()
+            self.cond.notify_all()  # the next in line may now be first for another free slot
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            with self.cond:
+                del self.active[ticket]
+                self.durations.append(time.monotonic() - start)
+                self._rebalance()
+                self.cond.notify_all()
+
+    # (position, estimated seconds until start) for a job that is waiting and has nothing running
+    # yet, otherwise None. The estimate assumes recent downloads' average duration.
+    def position(self, job_id):
+        with self.cond:
+            if any(t.job_id == job_id for t in self.active):
+                return None
+            ranked = self._ranked()
+            pos = next((i for i, t in enumerate(ranked) if t.job_id == job_id), None)
+            if pos is None:
+                return None
+            avg = sum(self.durations) / len(self.durations) if self.durations else 0
+            return pos + 1, avg * (pos // self.slots + 1)
+
+    def usage(self):
+        with self.cond:
+            return len(self.active), len(self.waiting)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
@@ -2,4 +2,5 @@
 
 apt-get update && apt-get install -y ffmpeg
 
-streamlit run main.py --server.port $PORT --server.enableCORS false
+# launch.py serves finished downloads under /files/ on the Streamlit port
+python launch.py run main.py --server.port $PORT --server.enableCORS false
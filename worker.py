@@ -0,0 +1,78 @@
+import os, sys, socket, argparse, threading
+from functools import partial
+import downloader, diskspace, fragments, jobs, mediacache, scheduler
+
+# Download worker for remote jobs (REMOTE_WORKERS=1 for the UI, batch.py --remote). Run any number of
+# them, on this box or others: each leases playlist, channel and sync items from the job database,
+# downloads them into the job's directory under JOBS_DIR and writes progress and results to the item.
+# The job thread in the UI or batch process only lists entries, waits and builds the ZIP, so JOBS_DIR
+# must be storage every worker shares with it. The SQLite queue is enough for processes on one box;
+# across hosts the database needs a filesystem whose locks SQLite can rely on (not NFS).
+# A heartbeat renews this worker's leases every LEASE / 4 seconds. If the process dies they lapse and
+# another worker takes the items over, continuing from the .part files left behind; on Ctrl-C they
+# are handed back at once.
+#
+#   REMOTE_WORKERS=1 streamlit run main.py
+#   python worker.py --threads 4
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Download items of remote jobs from a shared job database")
+    p.add_argument("--db", default=jobs.DB_PATH, help="job database shared with the UI or batch runner")
+    p.add_argument("--threads", type=int, default=4, help="items downloaded at once")
+    p.add_argument("--name", default=f"{socket.gethostname()}-{os.getpid()}", help="name leases are held under")
+    return p.parse_args(argv)
+
+# One leased item, downloaded like the job thread would as a listing of one entry.
+def download_item(manager, name, item, tuners):
+    job = manager.job(item['job_id'])
+    workdir = os.path.join(jobs.JOBS_DIR, job['id'])
+    os.makedirs(workdir, exist_ok=True)
+    tuner = tuners.setdefault(job['id'], fragments.FragmentTuner(job['fragments'] or 0,
+                                                                 scheduler.get_scheduler().max_fragments()))
+    slots = partial(scheduler.get_scheduler().slot, job['session'] or job['id'], job['id'])
+    part_bytes = {}
+    def on_event(kind, _, payload):
+        if kind != 'entry':
+            manager.item_event(job, item['idx'], kind, payload, part_bytes, name)
+    downloader.download_entries([{'id': item['video_id'], 'title': item['title']}],
+                                downloader.download_opts(workdir, job['format'], audio=job['audio']), 1, on_event,
+                                mediacache.get_cache(), slots=slots, disk=diskspace.get_budget(), tuner=tuner,
+                                audio=job['audio'])
+
+# An item whose download raised is failed rather than left leased: the heartbeat would keep its lease
+# alive with no thread working on it. Marking it is retried, e.g. while the database is locked.
+def work(manager, name, stop, tuners):
+    while not stop.is_set():
+        item = manager.lease(name)
+        if not item:
+            stop.wait(jobs.POLL)
+            continue
+        try:
+            download_item(manager, name, item, tuners)
+        except Exception as e:
+            print(f"{name}: item {item['idx']} of job {item['job_id']} failed: {e}", file=sys.stderr)
+            while not stop.is_set():
+                try:
+                    manager.update_leased(item['job_id'], item['idx'], name, status='failed', error=f"Worker {name}: {e}")
+                    break
+                except Exception:
+                    stop.wait(jobs.POLL)
+
+def main(argv=None):
+    args = parse_args(argv)
+    manager = jobs.JobManager(args.db, resume=False)
+    stop, tuners = threading.Event(), {}
+    manager.renew(args.name, args.threads)
+    for n in range(args.threads):
+        threading.Thread(target=work, args=(manager, args.name, stop, tuners), name=f"worker-{n}", daemon=True).start()
+    print(f"{args.name}: {args.threads} threads on {args.db}", file=sys.stderr)
+    try:
+        while not stop.wait(jobs.LEASE / 4):
+            manager.renew(args.name, args.threads)
+    except KeyboardInterrupt:
+        stop.set()
+        manager.release(args.name)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+import os, threading
+from contextlib import contextmanager
+
+# Long-lived YoutubeDL instances shared by every job in the process. An instance carries its loaded
+# extractors (and their caches, e.g. YouTube player code), cookies and HTTP keep-alive connections,
+# so a fresh one per video pays for all of that again on each item. lease(**overrides) hands out an
+# idle instance with per-call params (format, outtmpl, hooks, ...) applied and puts them back when
+# the lease ends; at most POOL_SIZE idle instances are kept (0 disables pooling).
+# yt_dlp takes a good part of a second to import, so it is imported on first use rather than with
+# this module (and everything that imports it, up to the UI's first page).
+POOL_SIZE = int(os.environ.get("YDL_POOL_SIZE", 16))
+BASE_OPTS = {'quiet': True, 'noprogress': True}
+HOOKS = {'progress_hooks': '_progress_hooks', 'post_hooks': '_post_hooks', 'postprocessor_hooks': '_postprocessor_hooks'}
+
+# YoutubeDL only reads format, outtmpl, hooks and postprocessors in __init__; the rest of params is read on use.
+# Postprocessors copy the postprocessor hooks when they are added, so they come last.
+def configure(ydl, params):
+    from yt_dlp.postprocessor import get_postprocessor
+    from yt_dlp.utils import POSTPROCESS_WHEN
+    ydl.params.clear()
+    ydl.params.update(params)
+    ydl._parse_outtmpl()
+    fmt = params.get('format')
+    ydl.format_selector = fmt if fmt in (None, '-') or callable(fmt) else ydl.build_format_selector(fmt)
+    for opt, attr in HOOKS.items():
+        setattr(ydl, attr, list(params.get(opt, [])))
+    ydl._pps = {when: [] for when in POSTPROCESS_WHEN}
+    for pp in params.get('postprocessors', []):
+        pp = dict(pp)
+        when = pp.pop('when', 'post_process')
+        ydl.add_post_processor(get_postprocessor(pp.pop('key'))(ydl, **pp), when=when)
+
+class YdlPool:
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self.lock = threading.Lock()
+        self.idle = []
+        self.stats = {'created': 0, 'reused': 0}
+
+    @contextmanager
+    def lease(self, **overrides):
+        from yt_dlp import YoutubeDL
+        with self.lock:
+            ydl = self.idle.pop() if self.idle else None
+            self.stats['reused' if ydl else 'created'] += 1
+        ydl = ydl or YoutubeDL(dict(BASE_OPTS))
+        base = dict(ydl.params)
+        try:
+            configure(ydl, {**base, **overrides})
+            yield ydl
+        finally:
+            configure(ydl, base)
+            with self.lock:
+                keep = len(self.idle) < self.size
+                if keep:
+                    self.idle.append(ydl)
+            if not keep:
+                ydl.close()
+
+    def clear(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for ydl in idle:
+            ydl.close()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = YdlPool()
+        return _pool